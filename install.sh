@@ -7,19 +7,23 @@ else
     # Récupérer l'argument
     ARGUMENT="$1"
 
-    # Initialiser la variable pour le script Python
+    # Initialiser les variables pour le script Python
+    SCRIPT_PATH=""
     PYTHON_SCRIPT=""
 
     # Déterminer le script Python en fonction de l'argument
     if [ "$ARGUMENT" == "strategy_multi_bitget" ]; then
-        PYTHON_SCRIPT="python3 Live-Tools-V2/strategies/bol_trend/strategy_multi_bitget.py"
+        SCRIPT_PATH="Live-Tools-V2/strategies/bol_trend/strategy_multi_bitget.py"
     elif [ "$ARGUMENT" == "trix_multi_bitmart_lite" ]; then
-        PYTHON_SCRIPT="python3 Live-Tools-V2/strategies/trix/multi_bitmart_lite.py"
+        SCRIPT_PATH="Live-Tools-V2/strategies/trix/multi_bitmart_lite.py"
     elif [ "$ARGUMENT" == "envelopes_multi_bitget" ]; then
-        PYTHON_SCRIPT="python3 Live-Tools-V2/strategies/envelopes/multi_bitget.py"
+        SCRIPT_PATH="Live-Tools-V2/strategies/envelopes/multi_bitget.py"
     else
         echo "Argument non reconnu. Aucun ajout ne sera effectué."
     fi
+    if [ -n "$SCRIPT_PATH" ]; then
+        PYTHON_SCRIPT="python3 $SCRIPT_PATH"
+    fi
 
     # Si un script Python a été défini, procéder à l'ajout
     if [ -n "$PYTHON_SCRIPT" ]; then
@@ -31,6 +35,14 @@ else
             echo "$PYTHON_SCRIPT" >> Live-Tools-V2/1hcron.sh
             echo "Le script $PYTHON_SCRIPT a été ajouté à 1hcron.sh"
         fi
+        # Enregistrer le script auprès du scheduler
+        touch Live-Tools-V2/strategies.txt
+        if grep -Fxq "$SCRIPT_PATH" Live-Tools-V2/strategies.txt; then
+            echo "Le script $SCRIPT_PATH est déjà enregistré dans strategies.txt"
+        else
+            echo "$SCRIPT_PATH" >> Live-Tools-V2/strategies.txt
+            echo "Le script $SCRIPT_PATH a été enregistré dans strategies.txt"
+        fi
     fi
 fi
 
@@ -52,12 +64,18 @@ pip install -r requirements.txt
 git update-index --assume-unchanged secret.py
 cd ..
 
-# Ajouter la tâche cron si elle n'existe pas déjà
-crontab -l | grep -q 'bash ./Live-Tools-V2/1hcron.sh'
+# Remplacer l'ancienne tâche horaire (attente aléatoire jusqu'à une heure) par le scheduler
+crontab -l 2>/dev/null | grep -q 'bash ./Live-Tools-V2/1hcron.sh'
+if [ $? -eq 0 ]; then
+    crontab -l 2>/dev/null | grep -v 'bash ./Live-Tools-V2/1hcron.sh' | crontab -
+    echo "Ancienne tâche cron horaire supprimée."
+fi
+
+# Le scheduler tourne en continu, cron le relance toutes les 5 minutes s'il s'est arrêté (flock : une seule instance)
+crontab -l 2>/dev/null | grep -q 'bash ./Live-Tools-V2/scheduler.sh'
 if [ $? -ne 0 ]; then
-    # Ajouter la tâche cron
-    (crontab -l 2>/dev/null; echo "0 * * * * sleep $((RANDOM % 3600)) && /bin/bash ./Live-Tools-V2/1hcron.sh >> cronlog.log") | crontab -
-    echo "Tâche cron ajoutée avec succès."
+    (crontab -l 2>/dev/null; echo "*/5 * * * * flock -n /tmp/live-tools-scheduler.lock /bin/bash ./Live-Tools-V2/scheduler.sh >> cronlog.log 2>&1") | crontab -
+    echo "Tâche cron du scheduler ajoutée avec succès."
 else
-    echo "La tâche cron existe déjà."
+    echo "La tâche cron du scheduler existe déjà."
 fi
@@ -0,0 +1,18 @@
+import sys
+sys.path.append("./Live-Tools-V2")
+from utilities.scheduler import Scheduler, load_strategy
+
+# Stratégies enregistrées par install.sh, un chemin de script par ligne
+strategies_path = "./Live-Tools-V2/strategies.txt"
+timeframe = "1h"
+# Secondes d'attente après la clôture de la bougie, puis décalage aléatoire borné pour étaler la charge
+delay = 5
+jitter = 30
+
+scheduler = Scheduler(timeframe, delay, jitter)
+with open(strategies_path, "r") as f:
+    for path in [line.strip() for line in f if line.strip()]:
+        scheduler.register(path, *load_strategy(path))
+        print(f"Stratégie enregistrée : {path}")
+
+scheduler.run_forever()
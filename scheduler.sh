@@ -0,0 +1,2 @@
+source Live-Tools-V2/.venv/bin/activate
+python3 -u Live-Tools-V2/scheduler.py
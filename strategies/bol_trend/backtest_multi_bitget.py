@@ -0,0 +1,42 @@
+import sys
+sys.path.append("./Live-Tools-V2")
+import asyncio
+from utilities.perp_bitget_async import AsyncPerpBitget
+from utilities.bol_trend import backtest_bol_trend
+from config_multi_bitget import timeframe, types, leverage, max_var, max_side_exposition, params_coin
+
+history_limit = 5 * 365 * 24
+initial_balance = 1000
+
+
+# Chargement de l'historique (complété dans la base locale à chaque lancement)
+async def load_ohlcv():
+    async with AsyncPerpBitget(
+        store_path="./Live-Tools-V2/database/ohlcv",
+        market_cache_path="./Live-Tools-V2/database/markets.json",
+    ) as async_bitget:
+        return await async_bitget.fetch_many_historical(list(params_coin), timeframe, history_limit)
+
+
+def main():
+    df_list = {pair: df for pair, df in asyncio.run(load_ohlcv()).items() if len(df) > 0}
+    print(f"--- Backtest Bollinger Trend on {len(df_list)} tokens {timeframe} Leverage x{leverage} ---")
+
+    result = backtest_bol_trend(
+        df_list,
+        params_coin,
+        leverage=leverage,
+        types=types,
+        max_var=max_var,
+        max_side_exposition=max_side_exposition,
+        initial_balance=initial_balance,
+    )
+
+    for key, value in result.summary().items():
+        print(f"{key}: {value}")
+    result.trades.to_csv("./Live-Tools-V2/database/backtest_trades.csv", index=False)
+    result.equity.to_csv("./Live-Tools-V2/database/backtest_equity.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,11 @@ import ccxt
 import ta
 import pandas as pd
 from utilities.perp_bitget import PerpBitget
+from utilities.market_data import get_market_data, close_market_data
 from utilities.custom_indicators import get_n_columns
 from utilities.var import ValueAtRisk
+from utilities.panel import build_panel
+from utilities.bol_trend import BOL_TREND_COLUMNS, bol_trend_signals, atr_stop_exits, last_closed_bar
 from datetime import datetime
 import time
 import json
@@ -291,31 +294,6 @@ def calculate_atr(df, window=14):
     atr = tr.rolling(window=window).mean()
     return atr
 
-# Modifications des fonctions pour intégrer l'ATR
-def open_long(row):
-    return (
-        row['n1_close'] < row['n1_higher_band'] 
-        and row['close'] > row['higher_band'] 
-        and row['close'] > row['long_ma']
-    )
-
-def close_long(row, entry_price, atr, multiplier=2):
-    """FERMETURE DYNAMIQUE LONG AVEC ATR."""
-    trailing_stop = entry_price - (atr * multiplier)
-    return row['close'] < trailing_stop
-
-def open_short(row):
-    return (
-        row['n1_close'] > row['n1_lower_band'] 
-        and row['close'] < row['lower_band'] 
-        and row['close'] < row['long_ma']
-    )
-
-def close_short(row, entry_price, atr, multiplier=2):
-    """FERMETURE DYNAMIQUE SHORT AVEC ATR."""
-    trailing_stop = entry_price + (atr * multiplier)
-    return row['close'] > trailing_stop
-
 print(f"--- Bollinger Trend on {len(params_coin)} tokens {timeframe} Leverage x{leverage} ---")
 
 bitget = PerpBitget(
@@ -324,10 +302,14 @@ bitget = PerpBitget(
     password=account["password"],
 )
 
-# Chargement des données
+# Chargement des données depuis le stockage partagé : rien n'est retéléchargé si une autre stratégie
+# vient de récupérer les bougies de cette heure
+market_data = get_market_data("./Live-Tools-V2/database/ohlcv", "./Live-Tools-V2/database/markets.json")
+ohlcv_data = market_data.get_ohlcv(list(params_coin), timeframe, 1000)
+close_market_data()
 df_list = {}
 for pair in params_coin:
-    temp_data = bitget.get_more_last_historical(pair, timeframe, 1000)
+    temp_data = ohlcv_data[pair]
     if len(temp_data) == 1000:
         df_list[pair] = temp_data
     else:
@@ -352,12 +334,15 @@ for pair in df_list:
     df["n1_lower_band"] = df["lower_band"].shift(1)
     df["n1_higher_band"] = df["higher_band"].shift(1)
 
-    df['iloc'] = range(len(df))
+# Signaux d'entrée sur tout le panel, le live lit la dernière bougie clôturée
+close_panel = build_panel(df_list, "close")
+signals = bol_trend_signals(close_panel, {column: build_panel(df_list, column) for column in BOL_TREND_COLUMNS})
+live_signals = last_closed_bar(signals, df_list)
 
 print("Indicators loaded 100%")
 
 # Calcul de la Value at Risk
-var = ValueAtRisk(df_list=df_list.copy())
+var = ValueAtRisk(df_list=df_list)
 var.update_cov(current_date=df_list["BTC/USDT:USDT"].index[-1], occurance_data=989)
 print("Value At Risk loaded 100%")
 
@@ -395,18 +380,23 @@ print(f"{len(positions)} active positions ({list(positions.keys())})")
 
 # Vérification pour fermer les positions
 positions_to_delete = []
-for pair in positions:
-    row = df_list[pair].iloc[-2]
-    atr = df_list[pair].iloc[-1]['atr']  # UTILISATION DE L'ATR
+# FERMETURE DYNAMIQUE AVEC ATR, évaluée pour toutes les positions en une fois
+held_pairs = list(positions)
+close_long_stops, close_short_stops = atr_stop_exits(
+    [df_list[pair].iloc[-2]["close"] for pair in held_pairs],
+    [df_list[pair].iloc[-1]["atr"] for pair in held_pairs],  # UTILISATION DE L'ATR
+    [positions[pair]["open_price"] for pair in held_pairs],
+)
+for pair, close_long_stop, close_short_stop in zip(held_pairs, close_long_stops, close_short_stops):
     position = positions[pair]
 
-    if position["side"] == "long" and close_long(row, position["open_price"], atr):
+    if position["side"] == "long" and close_long_stop:
         print(f"Closing long position on {pair}")
         if production:
             bitget.place_market_order(pair, "sell", position["size"], reduce=True)
             positions_to_delete.append(pair)
 
-    elif position["side"] == "short" and close_short(row, position["open_price"], atr):
+    elif position["side"] == "short" and close_short_stop:
         print(f"Closing short position on {pair}")
         if production:
             bitget.place_market_order(pair, "buy", position["size"], reduce=True)
@@ -418,16 +408,15 @@ for pair in positions_to_delete:
 # Ouverture de nouvelles positions
 for pair in df_list:
     if pair not in positions:
-        row = df_list[pair].iloc[-2]
         last_price = float(df_list[pair].iloc[-1]["close"])
         pct_sizing = params_coin[pair]["wallet_exposure"]
         atr = df_list[pair].iloc[-1]['atr']  # UTILISATION DE L'ATR
 
-        if open_long(row) and "long" in types:
+        if live_signals["open_long"][pair] and "long" in types:
             print(f"Opening long position on {pair}")
             # Logique d'ouverture de position longue
 
-        elif open_short(row) and "short" in types:
+        elif live_signals["open_short"][pair] and "short" in types:
             print(f"Opening short position on {pair}")
             # Logique d'ouverture de position courte
 
@@ -0,0 +1,247 @@
+# Configuration de la stratégie Bollinger Trend multi paires, partagée par le live et le backtest
+
+timeframe = "1h"
+types = ["long", "short"]
+leverage = 2
+max_var = 1
+max_side_exposition = 1
+
+params_coin = {
+
+    "BTC/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "AAVE/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "APE/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "APT/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "AVAX/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "AXS/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "C98/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "CRV/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "DOGE/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "DOT/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "DYDX/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "ETH/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "FIL/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "FTM/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "BNB/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "GALA/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "GMT/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "GRT/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "KNC/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "KSM/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "LRC/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "MANA/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "MASK/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    
+    "NEAR/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "ONE/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "OP/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "SAND/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "SHIB/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "SOL/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "STG/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+  
+    "WOO/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 1,
+        "long_ma_window": 500
+    },
+    "EGLD/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "ETC/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "JASMY/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "ROSE/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "XRP/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "EOS/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "BCH/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+    "LTC/USDT:USDT": {
+        "wallet_exposure": 0.05,
+        "bb_window": 100,
+        "bb_std": 2.25,
+        "long_ma_window": 500
+    },
+}
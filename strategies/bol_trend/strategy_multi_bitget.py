@@ -1,480 +1,305 @@
 import sys
 sys.path.append("./Live-Tools-V2")
-import ccxt
-import ta
-import pandas as pd
 from utilities.perp_bitget import PerpBitget
-from utilities.custom_indicators import get_n_columns
-from utilities.var import ValueAtRisk
+from utilities.market_data import get_market_data, close_market_data
+from utilities.perp_bitget_sim import SimulatedPerpBitget
+from utilities.instrumentation import RunMetrics
+from utilities.var import ValueAtRisk, VarGate
+from utilities.covariance import RollingCovariance, load_engine
+from utilities.panel import build_panel
+from utilities.bol_trend import BolTrendStates, live_signals
 from datetime import datetime
 import time
-import json
-import copy
 from secret import ACCOUNTS
-
-now = datetime.now()
-current_time = now.strftime("%d/%m/%Y %H:%M:%S")
-print("--- Start Execution Time :", current_time, "---")
+from config_multi_bitget import timeframe, types, leverage, max_var, max_side_exposition, params_coin
 
 account = ACCOUNTS["bitget1"]
 
 production = True
-timeframe = "1h"
-types = ["long", "short"]
-leverage = 2
-max_var = 1
-max_side_exposition = 1
-
-params_coin = {
-
-    "BTC/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "AAVE/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "APE/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "APT/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "AVAX/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "AXS/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "C98/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "CRV/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "DOGE/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "DOT/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "DYDX/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "ETH/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "FIL/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "FTM/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "BNB/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "GALA/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "GMT/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "GRT/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "KNC/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "KSM/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "LRC/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "MANA/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "MASK/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    
-    "NEAR/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "ONE/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "OP/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "SAND/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "SHIB/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "SOL/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "STG/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-  
-    "WOO/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 1,
-        "long_ma_window": 500
-    },
-    "EGLD/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "ETC/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "JASMY/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "ROSE/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "XRP/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "EOS/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "BCH/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-    "LTC/USDT:USDT": {
-        "wallet_exposure": 0.05,
-        "bb_window": 100,
-        "bb_std": 2.25,
-        "long_ma_window": 500
-    },
-}
-def open_long(row):
-    return (
-        row['n1_close'] < row['n1_higher_band'] 
-        and row['close'] > row['higher_band'] 
-        and row['close'] > row['long_ma']
-    )
+# Paper trading : ordres exécutés par l'échange simulé sur les bougies locales, compte conservé dans paper_state.json
+paper_trading = False
+# Appels à l'échange enregistrés dans un fichier (record) ou rejoués depuis celui-ci sans réseau (replay)
+session_record_path = None
+session_replay_path = None
+
+store_path = "./Live-Tools-V2/database/ohlcv"
+market_cache_path = "./Live-Tools-V2/database/markets.json"
+cov_path = "./Live-Tools-V2/database/covariance.npz"
+indicators_path = "./Live-Tools-V2/database/bol_trend_states.json"
+# Rendements de la fenêtre de covariance, comme update_cov(occurance_data=cov_window + 2)
+cov_window = 987
 
-def close_long(row):
-    return row['close'] < row['ma_band']
+# Client, mesures, covariance et indicateurs incrémentaux gardés entre deux exécutions (scheduler)
+_warm = {}
 
-def open_short(row):
-    return (
-        row['n1_close'] > row['n1_lower_band'] 
-        and row['close'] < row['lower_band'] 
-        and row['close'] < row['long_ma']
+
+def market_data():
+    # Service de données de marché du processus, partagé avec les autres stratégies et comptes
+    return get_market_data(
+        store_path,
+        market_cache_path,
+        record_path=session_record_path,
+        replay_path=session_replay_path,
     )
 
-def close_short(row):
-    return row['close'] > row['ma_band']
-
-print(f"--- Bollinger Trend on {len(params_coin)} tokens {timeframe} Leverage x{leverage} ---")
-
-bitget = PerpBitget(
-    apiKey=account["apiKey"],
-    secret=account["secret"],
-    password=account["password"],
-)
-
-# Chargement des données
-df_list = {}
-for pair in params_coin:
-    temp_data = bitget.get_more_last_historical(pair, timeframe, 1000)
-    if len(temp_data) == 1000:
-        df_list[pair] = temp_data
-    else:
-        print(f"Pair {pair} not loaded, length: {len(temp_data)}")
-print("Data OHLCV loaded 100%")
-
-# Calcul des indicateurs
-for pair in df_list:
-    df = df_list[pair]
-    params = params_coin[pair]
-    bol_band = ta.volatility.BollingerBands(close=df["close"], window=params["bb_window"], window_dev=params["bb_std"])
-    df["lower_band"] = bol_band.bollinger_lband()
-    df["higher_band"] = bol_band.bollinger_hband()
-    df["ma_band"] = bol_band.bollinger_mavg()
-
-    df['long_ma'] = ta.trend.SMAIndicator(close=df['close'], window=params["long_ma_window"]).sma_indicator()
-    
-    df["n1_close"] = df["close"].shift(1)
-    df["n1_lower_band"] = df["lower_band"].shift(1)
-    df["n1_higher_band"] = df["higher_band"].shift(1)
-
-    df['iloc'] = range(len(df))
-
-print("Indicators loaded 100%")
-
-# Calcul de la Value at Risk
-var = ValueAtRisk(df_list=df_list.copy())
-var.update_cov(current_date=df_list["BTC/USDT:USDT"].index[-1], occurance_data=989)
-print("Value At Risk loaded 100%")
-
-# Récupération du solde en USD
-usd_balance = float(bitget.get_usdt_equity())
-print("USD balance :", round(usd_balance, 2), "$")
-
-# Récupération des positions ouvertes
-positions_data = bitget.get_open_position()
-position_list = []
-
-for d in positions_data:
-    if d["symbol"] in df_list:
-        try:
-            # Récupération du prix du marché actuel
-            ticker = bitget._session.fetch_ticker(d["symbol"])
-            market_price = float(ticker["last"])
-            position_info = {
-                "pair": d["symbol"],
-                "side": d["side"],
-                "size": float(d["contracts"]) * float(d["contractSize"]),
-                "market_price": market_price,
-                "usd_size": float(d["contracts"]) * float(d["contractSize"]) * market_price,
-                "open_price": float(d["entryPrice"])
-            }
-            position_list.append(position_info)
-        except Exception as e:
-            print(f"Erreur lors du traitement de la position pour {d['symbol']}: {e}")
-
-positions = {}
-for pos in position_list:
-    positions[pos["pair"]] = {
-        "side": pos["side"],
-        "size": pos["size"],
-        "market_price": pos["market_price"],
-        "usd_size": pos["usd_size"],
-        "open_price": pos["open_price"]
-    }
-
-print(f"{len(positions)} active positions ({list(positions.keys())})")
-
-# Vérification pour fermer les positions
-positions_to_delete = []
-for pair in positions:
-    row = df_list[pair].iloc[-2]
-    last_price = float(df_list[pair].iloc[-1]["close"])
-    position = positions[pair]
-
-    if position["side"] == "long" and close_long(row):
-        close_long_market_price = last_price
-        close_long_quantity = float(
-            bitget.convert_amount_to_precision(pair, position["size"])
-        )
-        exchange_close_long_quantity = close_long_quantity * close_long_market_price
-        print(
-            f"Place Close Long Market Order: {close_long_quantity} {pair[:-5]} at the price of {close_long_market_price}$ ~{round(exchange_close_long_quantity, 2)}$"
-        )
-        if production:
-            bitget.place_market_order(pair, "sell", close_long_quantity, reduce=True)
-            positions_to_delete.append(pair)
-
-    elif position["side"] == "short" and close_short(row):
-        close_short_market_price = last_price
-        close_short_quantity = float(
-            bitget.convert_amount_to_precision(pair, position["size"])
+
+def create_exchange(metrics=None):
+    if paper_trading:
+        return SimulatedPerpBitget(
+            store_path=store_path,
+            timeframe=timeframe,
+            state_path="./Live-Tools-V2/database/paper_state.json",
+            market_cache_path=market_cache_path,
         )
-        exchange_close_short_quantity = close_short_quantity * close_short_market_price
-        print(
-            f"Place Close Short Market Order: {close_short_quantity} {pair[:-5]} at the price of {close_short_market_price}$ ~{round(exchange_close_short_quantity, 2)}$"
+    return PerpBitget(
+        apiKey=account["apiKey"],
+        secret=account["secret"],
+        password=account["password"],
+        store_path=store_path,
+        market_cache_path=market_cache_path,
+        record_path=session_record_path,
+        replay_path=session_replay_path,
+        metrics=metrics,
+    )
+
+
+def close():
+    """ Save the indicator states and close the market data services kept open between executions
+    """
+    if "indicators" in _warm:
+        _warm["indicators"].save(indicators_path)
+    close_market_data()
+
+
+def run():
+    """ One execution of the strategy: signals of the last closed candle, exits, then entries
+        under the VaR and exposure limits
+
+        The exchange client, the metrics, the covariance engine and the indicator states are
+        created by the first call and reused by the next ones when the scheduler keeps the process
+        alive, the indicators then only advance by the candles closed since the previous call.
+        Candles and tickers come from the market data service of the process, shared with the
+        other strategies.
+    """
+    now = datetime.now()
+    current_time = now.strftime("%d/%m/%Y %H:%M:%S")
+    print("--- Start Execution Time :", current_time, "---")
+    print(f"--- Bollinger Trend on {len(params_coin)} tokens {timeframe} Leverage x{leverage} ---")
+
+    if "bitget" not in _warm:
+        # Mesures par étape (durée, requêtes, octets, mémoire) en JSON lines et au format Prometheus
+        _warm["metrics"] = RunMetrics(
+            "strategy_multi_bitget",
+            jsonl_path="./Live-Tools-V2/database/metrics/strategy_multi_bitget.jsonl",
+            prometheus_path="./Live-Tools-V2/database/metrics/strategy_multi_bitget.prom",
         )
-        if production:
-            bitget.place_market_order(pair, "buy", close_short_quantity, reduce=True)
-            positions_to_delete.append(pair)
-
-for pair in positions_to_delete:
-    del positions[pair]
-
-# Vérification de la VaR actuelle
-positions_exposition = {}
-long_exposition = 0
-short_exposition = 0
-for pair in df_list:
-    positions_exposition[pair] = {"long": 0, "short": 0}
-
-positions_data = bitget.get_open_position()
-for pos in positions_data:
-    if pos["symbol"] in df_list:
-        try:
-            ticker = bitget._session.fetch_ticker(pos["symbol"])
-            market_price = float(ticker["last"])
-            pct_exposition = (float(pos["contracts"]) * float(pos["contractSize"]) * market_price) / usd_balance
-            if pos["side"] == "long":
-                positions_exposition[pos["symbol"]]["long"] += pct_exposition
-                long_exposition += pct_exposition
-            elif pos["side"] == "short":
-                positions_exposition[pos["symbol"]]["short"] += pct_exposition
-                short_exposition += pct_exposition
-        except Exception as e:
-            print(f"Erreur lors du calcul de l'exposition pour {pos['symbol']}: {e}")
-
-current_var = var.get_var(positions=positions_exposition)
-print(f"Current VaR risk 1 period: -{round(current_var, 2)}%, LONG exposition {round(long_exposition * 100, 2)}%, SHORT exposition {round(short_exposition * 100, 2)}%")
-
-# Ouverture de nouvelles positions
-for pair in df_list:
-    if pair not in positions:
-        try:
-            row = df_list[pair].iloc[-2]
+        _warm["bitget"] = create_exchange(_warm["metrics"])
+    run_metrics = _warm["metrics"]
+    run_metrics.reset()
+    bitget = _warm["bitget"]
+
+    # Mesures écrites même si l'exécution échoue, ce sont celles à analyser en priorité
+    try:
+        # Table des marchés chargée d'emblée (depuis le cache disque si possible) pour mesurer son coût à part
+        run_metrics.begin("markets")
+        bitget.market
+
+        # Chargement des données (toutes les paires en parallèle, une seule fois par bougie pour tout le processus)
+        run_metrics.begin("ohlcv")
+        ohlcv_data = market_data().get_ohlcv(list(params_coin), timeframe, 1000, metrics=run_metrics)
+        df_list = {}
+        for pair in params_coin:
+            temp_data = ohlcv_data[pair]
+            if len(temp_data) == 1000:
+                df_list[pair] = temp_data
+            else:
+                print(f"Pair {pair} not loaded, length: {len(temp_data)}")
+        print("Data OHLCV loaded 100%")
+
+        if paper_trading:
+            # Horloge simulée amenée à maintenant : funding et ordres en attente depuis la dernière exécution
+            bitget.reload_candles()
+            bitget.set_time(int(time.time() * 1000))
+
+        # Indicateurs incrémentaux gardés en mémoire (sauvegardés par close()) : seules les bougies clôturées
+        # depuis la dernière exécution sont ajoutées, l'historique complet n'est rejoué qu'au premier lancement
+        run_metrics.begin("indicators")
+        if "indicators" not in _warm:
+            _warm["indicators"] = BolTrendStates.load(indicators_path, params_coin)
+        signals = live_signals(_warm["indicators"].update(df_list))
+        close_panel = build_panel(df_list, "close")
+
+        print("Indicators loaded 100%")
+
+        # Calcul de la Value at Risk
+        run_metrics.begin("var")
+        # Covariance incrémentale sauvegardée entre deux exécutions : seules les nouvelles bougies sont ajoutées.
+        # Même fenêtre que update_cov(occurance_data=cov_window + 2), jusqu'à l'avant-dernière bougie clôturée,
+        # et mêmes règles de validité des paires (min_coverage, bougie à current_date).
+        current_date = df_list["BTC/USDT:USDT"].index[-1]
+        cov_engine = _warm.get("cov_engine")
+        if cov_engine is None or cov_engine.symbols != list(df_list):
+            cov_engine = load_engine(cov_path, list(df_list)) or RollingCovariance(list(df_list), window=cov_window)
+        cov_engine.update_panel(close_panel.loc[:current_date].iloc[:-2])
+        _warm["cov_engine"] = cov_engine
+        cov_engine.save(cov_path)
+        var = ValueAtRisk(panel=close_panel)
+        var.update_cov_from(cov_engine, current_date=current_date)
+        print("Value At Risk loaded 100%")
+
+        # Récupération du solde, des positions et des prix en une seule fois
+        run_metrics.begin("positions")
+        tickers = None if paper_trading else market_data().get_tickers(list(df_list), metrics=run_metrics)
+        snapshot = bitget.snapshot(tickers=tickers)
+        usd_balance = snapshot.usdt_equity
+        print("USD balance :", round(usd_balance, 2), "$")
+
+        # Récupération des positions ouvertes
+        position_list = []
+
+        for d in snapshot.positions:
+            if d["symbol"] in df_list:
+                try:
+                    # Prix du marché actuel
+                    market_price = snapshot.last_price(d["symbol"])
+                    position_info = {
+                        "pair": d["symbol"],
+                        "side": d["side"],
+                        "size": float(d["contracts"]) * float(d["contractSize"]),
+                        "market_price": market_price,
+                        "usd_size": float(d["contracts"]) * float(d["contractSize"]) * market_price,
+                        "open_price": float(d["entryPrice"])
+                    }
+                    position_list.append(position_info)
+                except Exception as e:
+                    print(f"Erreur lors du traitement de la position pour {d['symbol']}: {e}")
+
+        positions = {}
+        for pos in position_list:
+            positions[pos["pair"]] = {
+                "side": pos["side"],
+                "size": pos["size"],
+                "market_price": pos["market_price"],
+                "usd_size": pos["usd_size"],
+                "open_price": pos["open_price"]
+            }
+
+        print(f"{len(positions)} active positions ({list(positions.keys())})")
+
+        # Vérification pour fermer les positions
+        run_metrics.begin("orders")
+        positions_to_delete = []
+        for pair in positions:
             last_price = float(df_list[pair].iloc[-1]["close"])
-            pct_sizing = params_coin[pair]["wallet_exposure"]
-            if open_long(row) and "long" in types:
-                long_market_price = last_price
-                long_quantity_in_usd = usd_balance * pct_sizing * leverage
-                temp_positions = copy.deepcopy(positions_exposition)
-                temp_positions[pair]["long"] += (long_quantity_in_usd / usd_balance)
-                temp_long_exposition = long_exposition + (long_quantity_in_usd / usd_balance)
-                temp_var = var.get_var(positions=temp_positions)
-                if temp_var > max_var or temp_long_exposition > max_side_exposition:
-                    print(f"Blocked open LONG on {pair}, because next VaR: -{round(temp_var, 2)}%")
-                else:
-                    long_quantity = float(bitget.convert_amount_to_precision(pair, long_quantity_in_usd / long_market_price))
-                    exchange_long_quantity = long_quantity * long_market_price
-                    print(
-                        f"Place Open Long Market Order: {long_quantity} {pair[:-5]} at the price of {long_market_price}$ ~{round(exchange_long_quantity, 2)}$"
-                    )
-                    if production:
-                        bitget.place_market_order(pair, "buy", long_quantity, reduce=False)
-                        positions_exposition[pair]["long"] += (long_quantity_in_usd / usd_balance)
-                        long_exposition += (long_quantity_in_usd / usd_balance)
-
-            elif open_short(row) and "short" in types:
-                short_market_price = last_price
-                short_quantity_in_usd = usd_balance * pct_sizing * leverage
-                temp_positions = copy.deepcopy(positions_exposition)
-                temp_positions[pair]["short"] += (short_quantity_in_usd / usd_balance)
-                temp_short_exposition = short_exposition + (short_quantity_in_usd / usd_balance)
-                temp_var = var.get_var(positions=temp_positions)
-                if temp_var > max_var or temp_short_exposition > max_side_exposition:
-                    print(f"Blocked open SHORT on {pair}, because next VaR: -{round(temp_var, 2)}%")
-                else:
-                    short_quantity = float(bitget.convert_amount_to_precision(pair, short_quantity_in_usd / short_market_price))
-                    exchange_short_quantity = short_quantity * short_market_price
-                    print(
-                        f"Place Open Short Market Order: {short_quantity} {pair[:-5]} at the price of {short_market_price}$ ~{round(exchange_short_quantity, 2)}$"
-                    )
-                    if production:
-                        bitget.place_market_order(pair, "sell", short_quantity, reduce=False)
-                        positions_exposition[pair]["short"] += (short_quantity_in_usd / usd_balance)
-                        short_exposition += (short_quantity_in_usd / usd_balance)
-        except Exception as e:
-            print(f"Error on {pair} ({e}), skip {pair}")
-
-now = datetime.now()
-current_time = now.strftime("%d/%m/%Y %H:%M:%S")
-print("--- End Execution Time :", current_time, "---")
+            position = positions[pair]
+
+            if position["side"] == "long" and signals["close_long"][pair]:
+                close_long_market_price = last_price
+                close_long_quantity = float(
+                    bitget.convert_amount_to_precision(pair, position["size"])
+                )
+                exchange_close_long_quantity = close_long_quantity * close_long_market_price
+                print(
+                    f"Place Close Long Market Order: {close_long_quantity} {pair[:-5]} at the price of {close_long_market_price}$ ~{round(exchange_close_long_quantity, 2)}$"
+                )
+                if production:
+                    bitget.place_market_order(pair, "sell", close_long_quantity, reduce=True)
+                    positions_to_delete.append(pair)
+
+            elif position["side"] == "short" and signals["close_short"][pair]:
+                close_short_market_price = last_price
+                close_short_quantity = float(
+                    bitget.convert_amount_to_precision(pair, position["size"])
+                )
+                exchange_close_short_quantity = close_short_quantity * close_short_market_price
+                print(
+                    f"Place Close Short Market Order: {close_short_quantity} {pair[:-5]} at the price of {close_short_market_price}$ ~{round(exchange_close_short_quantity, 2)}$"
+                )
+                if production:
+                    bitget.place_market_order(pair, "buy", close_short_quantity, reduce=True)
+                    positions_to_delete.append(pair)
+
+        for pair in positions_to_delete:
+            del positions[pair]
+
+        # Vérification de la VaR actuelle
+        positions_exposition = {}
+        long_exposition = 0
+        short_exposition = 0
+        for pair in df_list:
+            positions_exposition[pair] = {"long": 0, "short": 0}
+
+        for pos in snapshot.positions:
+            # Les positions fermées ci-dessus ne comptent plus dans l'exposition
+            if pos["symbol"] in df_list and pos["symbol"] not in positions_to_delete:
+                try:
+                    market_price = snapshot.last_price(pos["symbol"])
+                    pct_exposition = (float(pos["contracts"]) * float(pos["contractSize"]) * market_price) / usd_balance
+                    if pos["side"] == "long":
+                        positions_exposition[pos["symbol"]]["long"] += pct_exposition
+                        long_exposition += pct_exposition
+                    elif pos["side"] == "short":
+                        positions_exposition[pos["symbol"]]["short"] += pct_exposition
+                        short_exposition += pct_exposition
+                except Exception as e:
+                    print(f"Erreur lors du calcul de l'exposition pour {pos['symbol']}: {e}")
+
+        current_var = var.get_var(positions=positions_exposition)
+        print(f"Current VaR risk 1 period: -{round(current_var, 2)}%, LONG exposition {round(long_exposition * 100, 2)}%, SHORT exposition {round(short_exposition * 100, 2)}%")
+        var_gate = VarGate(var, positions_exposition, max_var, max_side_exposition)
+
+        # Ouverture de nouvelles positions
+        for pair in df_list:
+            if pair not in positions:
+                try:
+                    last_price = float(df_list[pair].iloc[-1]["close"])
+                    pct_sizing = params_coin[pair]["wallet_exposure"]
+                    if signals["open_long"][pair] and "long" in types:
+                        long_market_price = last_price
+                        long_quantity_in_usd = usd_balance * pct_sizing * leverage
+                        allowed, temp_var = var_gate.check(pair, "long", long_quantity_in_usd / usd_balance)
+                        if not allowed:
+                            print(f"Blocked open LONG on {pair}, because next VaR: -{round(temp_var, 2)}%")
+                        else:
+                            long_quantity = float(bitget.convert_amount_to_precision(pair, long_quantity_in_usd / long_market_price))
+                            exchange_long_quantity = long_quantity * long_market_price
+                            print(
+                                f"Place Open Long Market Order: {long_quantity} {pair[:-5]} at the price of {long_market_price}$ ~{round(exchange_long_quantity, 2)}$"
+                            )
+                            if production:
+                                bitget.place_market_order(pair, "buy", long_quantity, reduce=False)
+                                var_gate.accept(pair, "long", long_quantity_in_usd / usd_balance)
+
+                    elif signals["open_short"][pair] and "short" in types:
+                        short_market_price = last_price
+                        short_quantity_in_usd = usd_balance * pct_sizing * leverage
+                        allowed, temp_var = var_gate.check(pair, "short", short_quantity_in_usd / usd_balance)
+                        if not allowed:
+                            print(f"Blocked open SHORT on {pair}, because next VaR: -{round(temp_var, 2)}%")
+                        else:
+                            short_quantity = float(bitget.convert_amount_to_precision(pair, short_quantity_in_usd / short_market_price))
+                            exchange_short_quantity = short_quantity * short_market_price
+                            print(
+                                f"Place Open Short Market Order: {short_quantity} {pair[:-5]} at the price of {short_market_price}$ ~{round(exchange_short_quantity, 2)}$"
+                            )
+                            if production:
+                                bitget.place_market_order(pair, "sell", short_quantity, reduce=False)
+                                var_gate.accept(pair, "short", short_quantity_in_usd / usd_balance)
+                except Exception as e:
+                    print(f"Error on {pair} ({e}), skip {pair}")
+
+        if paper_trading:
+            bitget.save()
+    finally:
+        run_metrics.finish()
+
+    now = datetime.now()
+    current_time = now.strftime("%d/%m/%Y %H:%M:%S")
+    print("--- End Execution Time :", current_time, "---")
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    finally:
+        close()
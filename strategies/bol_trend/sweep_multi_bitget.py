@@ -0,0 +1,37 @@
+import sys
+sys.path.append("./Live-Tools-V2")
+import asyncio
+import numpy as np
+from utilities.perp_bitget_async import AsyncPerpBitget
+from utilities.panel import build_panel
+from utilities.sweep import run_sweep, save_sweep, best_params
+from config_multi_bitget import timeframe, types, leverage, params_coin
+
+history_limit = 5 * 365 * 24
+bb_windows = list(range(50, 550, 10))
+bb_stds = list(np.arange(0.75, 3.25, 0.25))
+long_ma_windows = list(range(100, 1100, 100))
+
+
+# Chargement de l'historique (complété dans la base locale à chaque lancement)
+async def load_ohlcv():
+    async with AsyncPerpBitget(
+        store_path="./Live-Tools-V2/database/ohlcv",
+        market_cache_path="./Live-Tools-V2/database/markets.json",
+    ) as async_bitget:
+        return await async_bitget.fetch_many_historical(list(params_coin), timeframe, history_limit)
+
+
+if __name__ == "__main__":
+    df_list = {pair: df for pair, df in asyncio.run(load_ohlcv()).items() if len(df) > 0}
+    close = build_panel(df_list, "close")
+    print(f"--- Sweep Bollinger Trend on {len(df_list)} tokens {timeframe}, "
+          f"{len(bb_windows) * len(bb_stds) * len(long_ma_windows)} combinaisons par paire ---")
+
+    table = run_sweep(close, bb_windows, bb_stds, long_ma_windows, leverage=leverage, types=types)
+    save_sweep(table, "./Live-Tools-V2/database/sweep.npz")
+
+    for pair, params in best_params(table).items():
+        current = params_coin[pair]
+        print(f"{pair}: actuel {current['bb_window']}/{current['bb_std']}/{current['long_ma_window']}"
+              f" -> meilleur {params['bb_window']}/{params['bb_std']}/{params['long_ma_window']}")
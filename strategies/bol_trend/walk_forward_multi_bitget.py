@@ -0,0 +1,50 @@
+import sys
+sys.path.append("./Live-Tools-V2")
+import asyncio
+import numpy as np
+from utilities.perp_bitget_async import AsyncPerpBitget
+from utilities.panel import build_panel
+from utilities.walk_forward import run_walk_forward
+from config_multi_bitget import timeframe, types, leverage, max_var, max_side_exposition, params_coin
+
+history_limit = 5 * 365 * 24
+train_bars = 365 * 24
+test_bars = 90 * 24
+bb_windows = list(range(50, 550, 10))
+bb_stds = list(np.arange(0.75, 3.25, 0.25))
+long_ma_windows = list(range(100, 1100, 100))
+
+
+# Chargement de l'historique (complété dans la base locale à chaque lancement)
+async def load_ohlcv():
+    async with AsyncPerpBitget(
+        store_path="./Live-Tools-V2/database/ohlcv",
+        market_cache_path="./Live-Tools-V2/database/markets.json",
+    ) as async_bitget:
+        return await async_bitget.fetch_many_historical(list(params_coin), timeframe, history_limit)
+
+
+if __name__ == "__main__":
+    df_list = {pair: df for pair, df in asyncio.run(load_ohlcv()).items() if len(df) > 0}
+    close = build_panel(df_list, "close")
+    print(f"--- Walk-forward Bollinger Trend on {len(df_list)} tokens {timeframe} Leverage x{leverage} ---")
+
+    result = run_walk_forward(
+        close,
+        {pair: params_coin[pair]["wallet_exposure"] for pair in close.columns},
+        bb_windows,
+        bb_stds,
+        long_ma_windows,
+        train_bars,
+        test_bars,
+        leverage=leverage,
+        types=types,
+        max_var=max_var,
+        max_side_exposition=max_side_exposition,
+    )
+
+    print(result.folds.to_string(index=False))
+    print(result.stability().to_string())
+    print(f"Rendement out-of-sample : {result.equity.iloc[-1] / result.equity.iloc[0] - 1:.2%}")
+    result.params.to_csv("./Live-Tools-V2/database/walk_forward_params.csv", index=False)
+    result.equity.to_csv("./Live-Tools-V2/database/walk_forward_equity.csv")
@@ -0,0 +1,167 @@
+import math
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from utilities.covariance import RollingCovariance
+from utilities.var import ValueAtRisk, VarGate
+
+TRADE_COLUMNS = [
+    "pair", "side", "entry_time", "entry_price", "exit_time", "exit_price",
+    "size", "pnl", "fees", "funding",
+]
+
+
+@dataclass
+class BacktestResult():
+    """ Output of run_backtest
+
+        equity: equity at the close of every bar,
+        trades: one row per closed trade (TRADE_COLUMNS), pnl net of fees and funding,
+        exposure: long and short exposure in fraction of equity at every bar
+    """
+    equity: pd.Series
+    trades: pd.DataFrame
+    exposure: pd.DataFrame
+
+    def summary(self):
+        equity = self.equity.to_numpy()
+        drawdown = equity / np.maximum.accumulate(equity) - 1 if len(equity) else np.array([0.0])
+        pnl = self.trades["pnl"]
+        return {
+            "final_equity": float(equity[-1]) if len(equity) else math.nan,
+            "total_return": float(equity[-1] / equity[0] - 1) if len(equity) else math.nan,
+            "max_drawdown": float(drawdown.min()),
+            "trades": len(self.trades),
+            "win_rate": float((pnl > 0).mean()) if len(pnl) else math.nan,
+            "fees": float(self.trades["fees"].sum()),
+            "funding": float(self.trades["funding"].sum()),
+        }
+
+
+def run_backtest(close, signals, wallet_exposure, leverage=2, types=("long", "short"), max_var=None,
+                 max_side_exposition=None, fee_rate=0.0006, funding_rate=0.0001, funding_interval=8,
+                 initial_balance=1000, var_window=987):
+    """ Replay the live entry / exit / risk gating logic over a close panel
+
+        Each bar the signals of that (closed) bar are executed at its close, as the live script does
+        with the last closed candle and the current price: exits first, then entries in column order,
+        each entry sized at wallet_exposure * leverage of the equity and checked with VarGate against
+        the positions already open. The covariance is kept by a RollingCovariance fed up to the
+        previous bar, the same window as update_cov(occurance_data=var_window + 2) in the live script.
+
+        Args:
+            close(pd.DataFrame): time x symbol close panel,
+            signals(dict): "open_long", "close_long", "open_short", "close_short" -> time x symbol booleans,
+            wallet_exposure(dict): symbol -> fraction of equity per position before leverage,
+            max_var(float): maximum VaR in % of equity, None to disable the VaR check,
+            max_side_exposition(float): maximum long (resp. short) exposure, None to disable,
+            fee_rate(float): fee on the notional of every fill,
+            funding_rate(float or pd.DataFrame): funding per interval paid by longs to shorts, a
+                time x symbol panel gives the rate at each funding bar (NaN elsewhere),
+            funding_interval(int): hours between fundings when funding_rate is a scalar,
+            var_window(int): number of returns of the covariance window
+
+        Returns:
+            BacktestResult
+    """
+    symbols = list(close.columns)
+    index = close.index
+    timestamps = index.to_numpy()
+    # Prix connus reportés sur les trous, 0 avant la cotation (aucun signal n'y est possible)
+    prices = np.nan_to_num(close.ffill().to_numpy(dtype=np.float64))
+    raw_close = close.to_numpy(dtype=np.float64)
+    open_long = signals["open_long"].to_numpy(dtype=bool) & ("long" in types)
+    close_long = signals["close_long"].to_numpy(dtype=bool)
+    open_short = signals["open_short"].to_numpy(dtype=bool) & ("short" in types)
+    close_short = signals["close_short"].to_numpy(dtype=bool)
+    sizing = np.array([wallet_exposure[symbol] for symbol in symbols], dtype=np.float64) * leverage
+
+    if isinstance(funding_rate, pd.DataFrame):
+        funding = funding_rate.reindex(index=index, columns=symbols).fillna(0.0).to_numpy(dtype=np.float64)
+    else:
+        funding_bars = (index.hour % funding_interval == 0) & (index.minute == 0)
+        funding = np.where(funding_bars[:, None], funding_rate, 0.0) * np.ones(len(symbols))
+
+    gating = max_var is not None or max_side_exposition is not None
+    if gating:
+        var = ValueAtRisk(panel=close)
+        engine = RollingCovariance(symbols, window=var_window)
+        # Bougies pas encore données au moteur de covariance, ajoutées en bloc quand une entrée est évaluée
+        fed = 0
+
+    n_bars, n_symbols = prices.shape
+    balance = float(initial_balance)
+    quantity = np.zeros(n_symbols)
+    entry_price = np.zeros(n_symbols)
+    entry_bar = np.zeros(n_symbols, dtype=np.int64)
+    fees_paid = np.zeros(n_symbols)
+    funding_paid = np.zeros(n_symbols)
+    equity = np.empty(n_bars)
+    exposure = np.zeros((n_bars, 2))
+    trades = []
+
+    def close_position(i, t, price):
+        nonlocal balance
+        fee = abs(quantity[i]) * price * fee_rate
+        balance += quantity[i] * (price - entry_price[i]) - fee
+        gross_pnl = quantity[i] * (price - entry_price[i])
+        trades.append((
+            symbols[i], "long" if quantity[i] > 0 else "short", timestamps[entry_bar[i]], entry_price[i],
+            timestamps[t], price, abs(quantity[i]), gross_pnl - fees_paid[i] - fee - funding_paid[i],
+            fees_paid[i] + fee, funding_paid[i],
+        ))
+        quantity[i] = 0.0
+
+    for t in range(n_bars):
+        price = prices[t]
+
+        # Funding : les longs paient les shorts quand le taux est positif
+        held = quantity != 0
+        if held.any() and funding[t].any():
+            payment = quantity * price * funding[t]
+            balance -= payment[held].sum()
+            funding_paid[held] += payment[held]
+
+        # Fermeture des positions
+        for i in np.flatnonzero((quantity > 0) & close_long[t] | (quantity < 0) & close_short[t]):
+            close_position(i, t, price[i])
+
+        # Ouverture de nouvelles positions
+        free = quantity == 0
+        wants_long = free & open_long[t]
+        wants_short = free & ~wants_long & open_short[t]
+        candidates = np.flatnonzero(wants_long | wants_short)
+        if len(candidates):
+            usd_balance = balance + (quantity * (price - entry_price)).sum()
+            if gating:
+                notional = np.abs(quantity) * price / usd_balance
+                positions = (np.where(quantity > 0, notional, 0.0), np.where(quantity < 0, notional, 0.0))
+                engine.update_many(timestamps[fed:t], raw_close[fed:t])
+                fed = t
+                var.update_cov_from(engine, keep_returns=False, current_date=index[t])
+                gate = VarGate(var, positions, math.inf if max_var is None else max_var, max_side_exposition)
+            for i in candidates:
+                side = "long" if wants_long[i] else "short"
+                if gating:
+                    allowed, _ = gate.check(symbols[i], side, sizing[i])
+                    if not allowed:
+                        continue
+                    gate.accept(symbols[i], side, sizing[i])
+                size = usd_balance * sizing[i] / price[i]
+                fee = size * price[i] * fee_rate
+                balance -= fee
+                quantity[i] = size if side == "long" else -size
+                entry_price[i] = price[i]
+                entry_bar[i] = t
+                fees_paid[i] = fee
+                funding_paid[i] = 0.0
+
+        equity[t] = balance + (quantity * (price - entry_price)).sum()
+        signed_notional = quantity * price
+        exposure[t] = signed_notional[quantity > 0].sum() / equity[t], -signed_notional[quantity < 0].sum() / equity[t]
+
+    return BacktestResult(
+        equity=pd.Series(equity, index=index, name="equity"),
+        trades=pd.DataFrame(trades, columns=TRADE_COLUMNS),
+        exposure=pd.DataFrame(exposure, index=index, columns=["long", "short"]),
+    )
@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+from utilities.panel import build_panel, group_by_param, rolling_mean, rolling_mean_std, lag
+from utilities.backtest import run_backtest
+from utilities.streaming_indicators import StreamingBollingerTrend, save_states, load_states
+
+BOL_TREND_COLUMNS = [
+    "lower_band", "higher_band", "ma_band", "long_ma",
+    "n1_close", "n1_lower_band", "n1_higher_band",
+]
+
+
+def bol_trend_indicators(close, params_coin):
+    """ Bollinger trend indicators of every symbol in one vectorized pass
+
+        Symbols sharing a bb_window (resp. long_ma_window) are computed together, and every
+        bb_std band is derived from the shared rolling mean/std.
+
+        Args:
+            close(pd.DataFrame): time x symbol close panel,
+            params_coin(dict): symbol -> {"bb_window", "bb_std", "long_ma_window", ...}
+
+        Returns:
+            dict: column name (BOL_TREND_COLUMNS) -> time x symbol DataFrame
+    """
+    symbols = list(close.columns)
+    values = close.to_numpy(dtype=np.float64)
+    ma_band = np.full(values.shape, np.nan)
+    std = np.full(values.shape, np.nan)
+    long_ma = np.full(values.shape, np.nan)
+
+    for window, columns in group_by_param(symbols, params_coin, "bb_window").items():
+        ma_band[:, columns], std[:, columns] = rolling_mean_std(values, window, columns)
+    for window, columns in group_by_param(symbols, params_coin, "long_ma_window").items():
+        long_ma[:, columns] = rolling_mean(values, window, columns)
+
+    bb_std = np.array([params_coin[symbol]["bb_std"] for symbol in symbols], dtype=np.float64)
+    higher_band = ma_band + bb_std * std
+    lower_band = ma_band - bb_std * std
+
+    indicators = {
+        "lower_band": lower_band,
+        "higher_band": higher_band,
+        "ma_band": ma_band,
+        "long_ma": long_ma,
+        "n1_close": lag(values),
+        "n1_lower_band": lag(lower_band),
+        "n1_higher_band": lag(higher_band),
+    }
+    return {
+        name: pd.DataFrame(array, index=close.index, columns=close.columns)
+        for name, array in indicators.items()
+    }
+
+
+SIGNAL_COLUMNS = ["open_long", "close_long", "open_short", "close_short"]
+
+
+def bol_trend_signals(close, indicators):
+    """ Entry and exit rules of the Bollinger trend strategy over a whole panel
+
+        NaN indicators (warm-up, missing candles) give False, as the row-wise rules did.
+
+        Args:
+            close(pd.DataFrame): time x symbol close panel,
+            indicators(dict): column name -> time x symbol DataFrame, as returned by bol_trend_indicators
+
+        Returns:
+            dict: signal name (SIGNAL_COLUMNS) -> time x symbol boolean DataFrame
+    """
+    values = close.to_numpy(dtype=np.float64)
+    column = {name: indicators[name].to_numpy(dtype=np.float64) for name in BOL_TREND_COLUMNS}
+    signals = {
+        "open_long": (
+            (column["n1_close"] < column["n1_higher_band"])
+            & (values > column["higher_band"])
+            & (values > column["long_ma"])
+        ),
+        "close_long": values < column["ma_band"],
+        "open_short": (
+            (column["n1_close"] > column["n1_lower_band"])
+            & (values < column["lower_band"])
+            & (values < column["long_ma"])
+        ),
+        "close_short": values > column["ma_band"],
+    }
+    return {
+        name: pd.DataFrame(array, index=close.index, columns=close.columns)
+        for name, array in signals.items()
+    }
+
+
+def atr_stop_exits(close, atr, entry_price, multiplier=2):
+    """ ATR stop exits of the ATR variant: a long closes below entry - multiplier * atr,
+        a short above entry + multiplier * atr
+
+        Works on scalars, arrays or panels as long as they broadcast together.
+
+        Returns:
+            tuple: (close_long, close_short) boolean arrays
+    """
+    close = np.asarray(close, dtype=np.float64)
+    stop_distance = np.asarray(atr, dtype=np.float64) * multiplier
+    entry_price = np.asarray(entry_price, dtype=np.float64)
+    return close < entry_price - stop_distance, close > entry_price + stop_distance
+
+
+def last_closed_bar(signals, df_list):
+    """ Value of every signal on the last closed candle (second to last row) of each symbol
+
+        Args:
+            signals(dict): signal name -> time x symbol boolean DataFrame,
+            df_list(dict): symbol -> OHLCV DataFrame the panel was built from
+
+        Returns:
+            dict: signal name -> {symbol: bool}
+    """
+    panel = next(iter(signals.values()))
+    symbols = [symbol for symbol in df_list if symbol in panel.columns and len(df_list[symbol]) >= 2]
+    rows = panel.index.get_indexer([df_list[symbol].index[-2] for symbol in symbols])
+    columns = panel.columns.get_indexer(symbols)
+    return {
+        name: dict(zip(symbols, signal.to_numpy()[rows, columns].tolist()))
+        for name, signal in signals.items()
+    }
+
+
+class BolTrendStates():
+    """ Streaming bol_trend indicators of every symbol, advanced by the candles closed since the last update
+
+        A symbol is replayed over its whole history only when it has no state yet, when its
+        parameters changed or when its last candle fed is no longer in the history (long stop).
+        Otherwise only the new closed candles are fed, O(1) each.
+
+        Args:
+            params_coin(dict): symbol -> {"bb_window", "bb_std", "long_ma_window", ...}
+    """
+
+    def __init__(self, params_coin):
+        self.params_coin = params_coin
+        self.states = {}
+        # Ouverture (ms) de la dernière bougie clôturée fournie à chaque symbole
+        self.last_timestamps = {}
+
+    @classmethod
+    def load(cls, path, params_coin):
+        """ States saved by save(), an empty set of states if there is none
+        """
+        states = cls(params_coin)
+        saved_states, last_timestamps = load_states(path)
+        states.states = saved_states
+        states.last_timestamps = last_timestamps or {}
+        return states
+
+    def save(self, path):
+        save_states(path, self.states, self.last_timestamps)
+
+    def _matches(self, state, params):
+        return (
+            state.bollinger.window == params["bb_window"]
+            and state.bollinger.window_dev == params["bb_std"]
+            and state.long_ma.window == params["long_ma_window"]
+        )
+
+    def update(self, df_list):
+        """ Feed the closed candles (every row but the running last one) not seen yet
+
+            Args:
+                df_list(dict): symbol -> OHLCV DataFrame indexed by timestamp
+
+            Returns:
+                dict: symbol -> indicators of its last closed candle (BOL_TREND_COLUMNS and "close")
+        """
+        rows = {}
+        for symbol, df in df_list.items():
+            closed = df["close"].iloc[:-1]
+            if len(closed) == 0:
+                continue
+            params = self.params_coin[symbol]
+            state = self.states.get(symbol)
+            last = self.last_timestamps.get(symbol)
+            if (
+                state is None or state.row is None or last is None or not self._matches(state, params)
+                or pd.Timestamp(last, unit="ms") not in closed.index
+            ):
+                state = StreamingBollingerTrend(params["bb_window"], params["bb_std"], params["long_ma_window"])
+                new = closed
+            else:
+                new = closed[closed.index > pd.Timestamp(last, unit="ms")]
+            for value in new.to_numpy(dtype=np.float64):
+                state.update(value)
+            self.states[symbol] = state
+            self.last_timestamps[symbol] = int(closed.index[-1].value // 10**6)
+            rows[symbol] = {"close": float(closed.iloc[-1]), **state.row}
+        return rows
+
+
+def live_signals(rows):
+    """ Signals of the last closed candle of every symbol from BolTrendStates.update rows
+
+        Returns:
+            dict: signal name -> {symbol: bool}
+    """
+    symbols = list(rows)
+    close = pd.DataFrame([[rows[symbol]["close"] for symbol in symbols]], columns=symbols, dtype=np.float64)
+    indicators = {
+        name: pd.DataFrame([[rows[symbol][name] for symbol in symbols]], columns=symbols, dtype=np.float64)
+        for name in BOL_TREND_COLUMNS
+    }
+    signals = bol_trend_signals(close, indicators)
+    return {name: dict(zip(symbols, signal.iloc[0].tolist())) for name, signal in signals.items()}
+
+
+def backtest_bol_trend(df_list, params_coin, **kwargs):
+    """ Backtest of the Bollinger trend strategy with the live configuration
+
+        Args:
+            df_list(dict): symbol -> OHLCV DataFrame indexed by timestamp,
+            params_coin(dict): symbol -> {"wallet_exposure", "bb_window", "bb_std", "long_ma_window"},
+            kwargs: leverage, types, max_var, max_side_exposition, fees... passed to run_backtest
+
+        Returns:
+            BacktestResult
+    """
+    close = build_panel(df_list, "close")
+    signals = bol_trend_signals(close, bol_trend_indicators(close, params_coin))
+    wallet_exposure = {symbol: params_coin[symbol]["wallet_exposure"] for symbol in close.columns}
+    return run_backtest(close, signals, wallet_exposure, **kwargs)
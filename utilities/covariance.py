@@ -0,0 +1,435 @@
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+_ENGINES = {}
+
+
+class CovarianceEngine(ABC):
+    """ Base class of the incremental covariance estimators
+
+        The engine is fed close prices one bar at a time (or a whole panel with update_panel),
+        turns them into simple returns and updates its state in O(N²) per bar. Missing closes
+        give NaN returns, excluded pairwise as pandas DataFrame.cov does.
+        save()/load_engine() keep the state on disk between runs.
+
+        Args:
+            symbols(list): symbols in column order
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _ENGINES[cls.__name__] = cls
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.last_timestamp = None
+        self.last_close = np.full(len(self.symbols), np.nan)
+
+    def update(self, timestamp, close):
+        """ Add one bar of close prices (order of self.symbols)
+        """
+        close = np.asarray(close, dtype=np.float64)
+        if self.last_timestamp is not None:
+            self._push(close / self.last_close - 1)
+        self.last_timestamp = pd.Timestamp(timestamp)
+        self.last_close = close
+
+    def update_many(self, timestamps, closes):
+        """ Add several bars at once (time x N closes), same result as calling update on each bar
+        """
+        closes = np.asarray(closes, dtype=np.float64).reshape(-1, len(self.symbols))
+        if len(closes) == 0:
+            return
+        previous = np.vstack([self.last_close[None], closes[:-1]])
+        returns = closes / previous - 1
+        if self.last_timestamp is None:
+            returns = returns[1:]
+        self._push_many(returns)
+        self.last_timestamp = pd.Timestamp(timestamps[-1])
+        self.last_close = closes[-1]
+
+    @abstractmethod
+    def _push(self, returns):
+        """ Add one row of returns to the state
+        """
+
+    def _push_many(self, returns):
+        for row in returns:
+            self._push(row)
+
+    def update_panel(self, close_panel):
+        """ Feed the rows of a time x symbol close panel newer than the last bar seen
+
+            The state is rebuilt from the whole panel when the panel does not contain the last
+            bar seen (history gap).
+
+            Returns:
+                int: number of bars added
+        """
+        close_panel = close_panel.reindex(columns=self.symbols)
+        if self.last_timestamp is not None and self.last_timestamp not in close_panel.index:
+            print(f"Historique de covariance incomplet depuis {self.last_timestamp}, reconstruction")
+            self.reset()
+        if self.last_timestamp is not None:
+            close_panel = close_panel[close_panel.index > self.last_timestamp]
+        self.update_many(close_panel.index, close_panel.to_numpy(dtype=np.float64))
+        return len(close_panel)
+
+    def reset(self):
+        type(self).__init__(self, **self._params())
+
+    @abstractmethod
+    def covariance(self):
+        """ Returns:
+                np.ndarray: N x N covariance of returns, NaN where there are not enough observations
+        """
+
+    @abstractmethod
+    def mean(self):
+        """ Returns:
+                np.ndarray: mean return of every symbol
+        """
+
+    @abstractmethod
+    def counts(self):
+        """ Returns:
+                np.ndarray: number of returns observed for every symbol
+        """
+
+    def returns(self):
+        """ Returns:
+                np.ndarray: returns kept by the engine (time x N), None if it does not keep them
+        """
+        return None
+
+    def _params(self):
+        return {"symbols": self.symbols}
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        state = {key: np.asarray(value) for key, value in self.__dict__.items() if key not in ("symbols", "last_timestamp")}
+        last_timestamp = -1 if self.last_timestamp is None else self.last_timestamp.value
+        tmp_file = path + ".tmp.npz"
+        np.savez(
+            tmp_file,
+            engine=type(self).__name__,
+            symbols=np.array(self.symbols, dtype=str),
+            last_timestamp=last_timestamp,
+            **state
+        )
+        os.replace(tmp_file, path)
+
+
+def load_engine(path, symbols=None):
+    """ Load an engine saved with CovarianceEngine.save
+
+        Args:
+            path(str): npz file,
+            symbols(list): expected symbols, a state built on other symbols is ignored
+
+        Returns:
+            CovarianceEngine: None if there is no usable saved state
+    """
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            state = {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+    engine_class = _ENGINES[str(state.pop("engine"))]
+    saved_symbols = [str(symbol) for symbol in state.pop("symbols")]
+    if symbols is not None and saved_symbols != list(symbols):
+        return None
+    last_timestamp = int(state.pop("last_timestamp"))
+    engine = engine_class.__new__(engine_class)
+    engine.symbols = saved_symbols
+    engine.last_timestamp = None if last_timestamp < 0 else pd.Timestamp(last_timestamp)
+    for key, value in state.items():
+        setattr(engine, key, value.item() if value.ndim == 0 else value)
+    return engine
+
+
+class RollingCovariance(CovarianceEngine):
+    """ Sample covariance (ddof=1) of the last `window` returns
+
+        Keeps pairwise running sums, adds the newest return and subtracts the expiring one.
+        Sums are recomputed from the buffer every `window` updates to cancel rounding drift.
+
+        Args:
+            symbols(list): symbols in column order,
+            window(int): number of returns in the estimation window
+    """
+
+    def __init__(self, symbols, window=987):
+        super().__init__(symbols)
+        n = len(self.symbols)
+        self.window = window
+        self.buffer = np.full((window, n), np.nan)
+        self.position = 0
+        self.updates = 0
+        # Sommes par couple (i, j) sur les observations où i et j sont toutes deux présentes
+        self.count = np.zeros((n, n))
+        self.sum = np.zeros((n, n))
+        self.cross = np.zeros((n, n))
+
+    def _params(self):
+        return {"symbols": self.symbols, "window": self.window}
+
+    @staticmethod
+    def _moments(returns):
+        n = returns.shape[1]
+        if not np.isnan(returns).any():
+            return (
+                np.full((n, n), float(len(returns))),
+                np.repeat(returns.sum(axis=0)[:, None], n, axis=1),
+                returns.T.dot(returns),
+            )
+        mask = (~np.isnan(returns)).astype(np.float64)
+        values = np.nan_to_num(returns)
+        return mask.T.dot(mask), values.T.dot(mask), values.T.dot(values)
+
+    def _push(self, returns):
+        expiring = self.buffer[self.position].copy()
+        self.buffer[self.position] = returns
+        self.position = (self.position + 1) % self.window
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self.count, self.sum, self.cross = self._moments(self.buffer)
+            return
+        for sign, row in ((1.0, returns), (-1.0, expiring)):
+            present = ~np.isnan(row)
+            if not present.any():
+                continue
+            values = np.where(present, row, 0.0)
+            mask = present.astype(np.float64)
+            self.count += sign * (mask[:, None] * mask)
+            self.sum += sign * (values[:, None] * mask)
+            self.cross += sign * (values[:, None] * values)
+
+    def _push_many(self, returns):
+        # Bloc de rendements ajouté et bloc expirant retiré par produits matriciels
+        n_returns = len(returns)
+        if n_returns == 0:
+            return
+        if n_returns >= self.window:
+            self.buffer = returns[-self.window:].copy()
+            self.position = 0
+            self.updates += n_returns
+            self.count, self.sum, self.cross = self._moments(self.buffer)
+            return
+        positions = (self.position + np.arange(n_returns)) % self.window
+        expiring = self.buffer[positions]
+        self.buffer[positions] = returns
+        self.position = (self.position + n_returns) % self.window
+        resync = (self.updates + n_returns) // self.window > self.updates // self.window
+        self.updates += n_returns
+        if resync:
+            self.count, self.sum, self.cross = self._moments(self.buffer)
+            return
+        for sign, block in ((1.0, returns), (-1.0, expiring)):
+            count, total, cross = self._moments(block)
+            self.count += sign * count
+            self.sum += sign * total
+            self.cross += sign * cross
+
+    def covariance(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (self.cross - self.sum * self.sum.T / self.count) / (self.count - 1)
+        cov[self.count < 2] = np.nan
+        return cov
+
+    def mean(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.diag(self.sum) / np.diag(self.count)
+
+    def counts(self):
+        return np.diag(self.count).copy()
+
+    def returns(self):
+        """ Returns:
+                np.ndarray: window x N returns in chronological order, NaN rows until the window is full
+        """
+        return np.roll(self.buffer, -self.position, axis=0)
+
+
+class EwmaCovariance(CovarianceEngine):
+    """ Exponentially weighted covariance of returns
+
+        mean += alpha * (r - mean), cov = (1 - alpha) * (cov + alpha * (r - mean)(r - mean)'),
+        pairs with a missing return keep their previous value.
+
+        Args:
+            symbols(list): symbols in column order,
+            halflife(float): number of bars after which an observation weighs half as much
+    """
+
+    def __init__(self, symbols, halflife=168):
+        super().__init__(symbols)
+        n = len(self.symbols)
+        self.halflife = halflife
+        self.alpha = 1 - np.exp(np.log(0.5) / halflife)
+        self.count = np.zeros(n)
+        self.mean_return = np.zeros(n)
+        self.cov = np.zeros((n, n))
+
+    def _params(self):
+        return {"symbols": self.symbols, "halflife": self.halflife}
+
+    def _push(self, returns):
+        valid = ~np.isnan(returns)
+        diff = np.where(valid, returns - self.mean_return, 0.0)
+        self.mean_return = self.mean_return + self.alpha * diff
+        both = np.outer(valid, valid)
+        self.cov = np.where(both, (1 - self.alpha) * (self.cov + self.alpha * np.outer(diff, diff)), self.cov)
+        self.count = self.count + valid
+
+    def covariance(self):
+        cov = self.cov.copy()
+        missing = self.count < 2
+        cov[missing, :] = np.nan
+        cov[:, missing] = np.nan
+        return cov
+
+    def mean(self):
+        return np.where(self.count > 0, self.mean_return, np.nan)
+
+    def counts(self):
+        return self.count.copy()
+
+
+class DenseCovariance():
+    """ Full N x N covariance, with the operations ValueAtRisk needs
+
+        Args:
+            matrix(np.ndarray): N x N covariance
+    """
+
+    def __init__(self, matrix):
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+
+    def dense(self):
+        return self.matrix
+
+    def diagonal(self):
+        return np.diag(self.matrix).copy()
+
+    def dot(self, x):
+        return self.matrix.dot(x)
+
+    def rows(self, index):
+        return self.matrix[index]
+
+    def subset(self, mask):
+        return DenseCovariance(self.matrix[np.ix_(mask, mask)])
+
+    def scenario_factors(self):
+        """ Returns:
+                tuple: (L, specific std) with cov = L.L' + diag(specific std²), None when there is no specific part
+        """
+        try:
+            return np.linalg.cholesky(self.matrix), None
+        except np.linalg.LinAlgError:
+            # Matrice non définie positive (historiques courts, paires colinéaires) : valeurs propres tronquées à 0
+            eigenvalues, eigenvectors = np.linalg.eigh(self.matrix)
+            return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None)), None
+
+
+class FactorCovariance():
+    """ Factor model covariance B.F.B' + diag(d), stored and applied in O(N.k)
+
+        Args:
+            loadings(np.ndarray): N x k exposures to the factors (B),
+            factor_cov(np.ndarray): k x k covariance of the factors (F),
+            specific_var(np.ndarray): idiosyncratic variance of every symbol (d)
+    """
+
+    def __init__(self, loadings, factor_cov, specific_var):
+        self.loadings = np.asarray(loadings, dtype=np.float64)
+        self.factor_cov = np.asarray(factor_cov, dtype=np.float64)
+        self.specific_var = np.asarray(specific_var, dtype=np.float64)
+
+    def dense(self):
+        return self.loadings.dot(self.factor_cov).dot(self.loadings.T) + np.diag(self.specific_var)
+
+    def diagonal(self):
+        return (self.loadings.dot(self.factor_cov) * self.loadings).sum(axis=1) + self.specific_var
+
+    def dot(self, x):
+        specific = self.specific_var * x if x.ndim == 1 else self.specific_var[:, None] * x
+        return self.loadings.dot(self.factor_cov.dot(self.loadings.T.dot(x))) + specific
+
+    def rows(self, index):
+        index = np.asarray(index)
+        rows = self.loadings[index].dot(self.factor_cov).dot(self.loadings.T)
+        rows[np.arange(len(index)), index] += self.specific_var[index]
+        return rows
+
+    def subset(self, mask):
+        return FactorCovariance(self.loadings[mask], self.factor_cov, self.specific_var[mask])
+
+    def scenario_factors(self):
+        eigenvalues, eigenvectors = np.linalg.eigh(self.factor_cov)
+        root = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+        return self.loadings.dot(root), np.sqrt(self.specific_var)
+
+    @classmethod
+    def pca(cls, returns=None, cov=None, n_factors=5):
+        """ Top `n_factors` principal components, the remaining variance becomes idiosyncratic
+
+            Args:
+                returns(np.ndarray): time x N returns without NaN (thin SVD, the N x N matrix is never built),
+                cov(np.ndarray): N x N covariance, used when returns are not available
+        """
+        if returns is not None:
+            centered = returns - returns.mean(axis=0)
+            _, singular_values, components = np.linalg.svd(centered, full_matrices=False)
+            eigenvalues = singular_values ** 2 / (len(returns) - 1)
+            eigenvectors = components.T
+            variance = (centered ** 2).sum(axis=0) / (len(returns) - 1)
+        else:
+            eigenvalues, eigenvectors = np.linalg.eigh(cov)
+            eigenvalues, eigenvectors = eigenvalues[::-1], eigenvectors[:, ::-1]
+            variance = np.diag(cov)
+        n_factors = min(n_factors, len(eigenvalues))
+        loadings = eigenvectors[:, :n_factors] * np.sqrt(np.clip(eigenvalues[:n_factors], 0, None))
+        specific_var = np.clip(variance - (loadings ** 2).sum(axis=1), 0, None)
+        return cls(loadings, np.eye(n_factors), specific_var)
+
+    @classmethod
+    def market(cls, returns=None, cov=None, weights=None):
+        """ Single market factor (weighted mean return, equal weights by default) plus idiosyncratic variance
+        """
+        n = (returns if returns is not None else cov).shape[1]
+        weights = np.full(n, 1 / n) if weights is None else np.asarray(weights, dtype=np.float64)
+        if returns is not None:
+            centered = returns - returns.mean(axis=0)
+            market = centered.dot(weights)
+            cov_with_market = centered.T.dot(market) / (len(returns) - 1)
+            variance = (centered ** 2).sum(axis=0) / (len(returns) - 1)
+        else:
+            cov_with_market = cov.dot(weights)
+            variance = np.diag(cov)
+        market_var = weights.dot(cov_with_market)
+        beta = cov_with_market / market_var
+        specific_var = np.clip(variance - beta ** 2 * market_var, 0, None)
+        return cls(beta[:, None], np.array([[market_var]]), specific_var)
+
+
+def embed_covariance(model, valid):
+    """ Extend a covariance model fitted on the valid symbols to all symbols, with zero covariance elsewhere
+    """
+    n = len(valid)
+    if valid.all():
+        return model
+    if isinstance(model, DenseCovariance):
+        matrix = np.zeros((n, n))
+        matrix[np.ix_(valid, valid)] = model.matrix
+        return DenseCovariance(matrix)
+    loadings = np.zeros((n, model.loadings.shape[1]))
+    loadings[valid] = model.loadings
+    specific_var = np.zeros(n)
+    specific_var[valid] = model.specific_var
+    return FactorCovariance(loadings, model.factor_cov, specific_var)
@@ -4,6 +4,7 @@ import pandas as pd
 import ta
 import math
 import requests
+from scipy.signal import lfilter
 
 def get_n_columns(df, columns, n=1):
     dt = df.copy()
@@ -186,15 +187,30 @@ class VMC():
         return pd.Series(money_flow, name="money_flow")
 
 
+def _ha_open_kernel(ha_close, first_open, start=0):
+    """ Heikin-Ashi open recurrence as a first-order IIR filter
+
+        ha_open[start] = first_open, then ha_open[i] = (ha_open[i-1] + ha_close[i-1]) / 2,
+        NaN before `start`.
+    """
+    ha_close = np.asarray(ha_close, dtype=np.float64)
+    ha_open = np.full(len(ha_close), np.nan)
+    if start >= len(ha_close):
+        return ha_open
+    ha_open[start] = first_open
+    if start + 1 < len(ha_close):
+        ha_open[start+1:], _ = lfilter([0.5], [1, -0.5], ha_close[start:-1], zi=[0.5 * first_open])
+    return ha_open
+
+
 def heikinAshiDf(df):
-    df['HA_Close'] = (df.open + df.high + df.low + df.close)/4
-    ha_open = [(df.open[0] + df.close[0]) / 2]
-    [ha_open.append((ha_open[i] + df.HA_Close.values[i]) / 2)
-     for i in range(0, len(df)-1)]
-    df['HA_Open'] = ha_open
-    df['HA_High'] = df[['HA_Open', 'HA_Close', 'high']].max(axis=1)
-    df['HA_Low'] = df[['HA_Open', 'HA_Close', 'low']].min(axis=1)
-    return df
+    dt = df.copy()
+    dt['HA_Close'] = (dt.open + dt.high + dt.low + dt.close)/4
+    first_open = (dt.open.iloc[0] + dt.close.iloc[0]) / 2 if len(dt) > 0 else np.nan
+    dt['HA_Open'] = _ha_open_kernel(dt['HA_Close'].to_numpy(), first_open)
+    dt['HA_High'] = dt[['HA_Open', 'HA_Close', 'high']].max(axis=1)
+    dt['HA_Low'] = dt[['HA_Open', 'HA_Close', 'low']].min(axis=1)
+    return dt
 
 class SmoothedHeikinAshi():
     def __init__(self, open, high, low, close, smooth1=5, smooth2=3):
@@ -207,20 +223,15 @@ class SmoothedHeikinAshi():
         self._run()
 
     def _calculate_ha_open(self):
-        ha_open = pd.Series(np.nan, index=self.open.index)
-        start = 0
-        for i in range(1, len(ha_open)):
-            if np.isnan(self.smooth_open.iloc[i]):
-                continue
-            else:
-                ha_open.iloc[i] = (self.smooth_open.iloc[i] + self.smooth_close.iloc[i]) / 2
-                start = i
-                break
-
-        for i in range(start + 1, len(ha_open)):
-            ha_open.iloc[i] = (ha_open.iloc[i-1] + self.ha_close.iloc[i-1]) / 2
-
-        return ha_open
+        smooth_open = self.smooth_open.to_numpy(dtype=np.float64)
+        smooth_close = self.smooth_close.to_numpy(dtype=np.float64)
+        # the recurrence starts on the first smoothed open available (index 0 excluded)
+        valid = np.flatnonzero(~np.isnan(smooth_open[1:]))
+        if len(valid) == 0:
+            return pd.Series(np.nan, index=self.open.index)
+        start = valid[0] + 1
+        first_open = (smooth_open[start] + smooth_close[start]) / 2
+        return pd.Series(_ha_open_kernel(self.ha_close.to_numpy(), first_open, start), index=self.open.index)
 
     def _run(self):
         self.smooth_open = ta.trend.ema_indicator(self.open, self.smooth1)
@@ -254,6 +265,66 @@ def volume_anomality(df, volume_window=10):
               "VolAnomaly"] = (-1) * dfInd["VolAnomaly"]
     return dfInd["VolAnomaly"]
 
+def _true_range(high, low, close):
+    prev_close = np.roll(close, 1, axis=0)
+    prev_close[0] = np.nan
+    return np.fmax(np.fmax(np.abs(high - low), np.abs(high - prev_close)), np.abs(prev_close - low))
+
+
+def _super_trend_kernel(close, upperband, lowerband):
+    """ SuperTrend recursion on 1D float64 buffers, final bands are updated in place
+    """
+    close = close.tolist()
+    final_upperband = upperband.tolist()
+    final_lowerband = lowerband.tolist()
+    supertrend = [True] * len(close)
+    nan = float("nan")
+    for i in range(1, len(close)):
+        prev_upper = final_upperband[i-1]
+        prev_lower = final_lowerband[i-1]
+        # if current close price crosses above upperband
+        if close[i] > prev_upper:
+            trend = True
+        # if current close price crosses below lowerband
+        elif close[i] < prev_lower:
+            trend = False
+        # else, the trend continues and the final bands are adjusted
+        else:
+            trend = supertrend[i-1]
+            if trend and final_lowerband[i] < prev_lower:
+                final_lowerband[i] = prev_lower
+            if not trend and final_upperband[i] > prev_upper:
+                final_upperband[i] = prev_upper
+        supertrend[i] = trend
+        # to remove bands according to the trend direction
+        if trend:
+            final_upperband[i] = nan
+        else:
+            final_lowerband[i] = nan
+    return supertrend, np.array(final_upperband), np.array(final_lowerband)
+
+
+def _super_trend_kernel_2d(close, upperband, lowerband):
+    """ Same recursion as _super_trend_kernel, stepping over time for all columns at once
+    """
+    final_upperband = upperband.copy()
+    final_lowerband = lowerband.copy()
+    supertrend = np.ones(close.shape, dtype=bool)
+    for i in range(1, len(close)):
+        prev_upper = final_upperband[i-1]
+        prev_lower = final_lowerband[i-1]
+        cross_up = close[i] > prev_upper
+        cross_down = ~cross_up & (close[i] < prev_lower)
+        keep = ~(cross_up | cross_down)
+        trend = np.where(keep, supertrend[i-1], cross_up)
+        supertrend[i] = trend
+        lower = np.where(keep & trend & (final_lowerband[i] < prev_lower), prev_lower, final_lowerband[i])
+        upper = np.where(keep & ~trend & (final_upperband[i] > prev_upper), prev_upper, final_upperband[i])
+        final_upperband[i] = np.where(trend, np.nan, upper)
+        final_lowerband[i] = np.where(trend, lower, np.nan)
+    return supertrend, final_upperband, final_lowerband
+
+
 class SuperTrend():
     def __init__(
         self,
@@ -269,71 +340,97 @@ class SuperTrend():
         self.atr_window = atr_window
         self.atr_multi = atr_multi
         self._run()
-        
+
     def _run(self):
-        # calculate ATR
-        price_diffs = [self.high - self.low, 
-                    self.high - self.close.shift(), 
-                    self.close.shift() - self.low]
-        true_range = pd.concat(price_diffs, axis=1)
-        true_range = true_range.abs().max(axis=1)
+        high = self.high.to_numpy(dtype=np.float64)
+        low = self.low.to_numpy(dtype=np.float64)
+        close = self.close.to_numpy(dtype=np.float64)
+        true_range = pd.Series(_true_range(high, low, close))
         # default ATR calculation in supertrend indicator
-        atr = true_range.ewm(alpha=1/self.atr_window,min_periods=self.atr_window).mean() 
-        # atr = ta.volatility.average_true_range(high, low, close, atr_period)
-        # df['atr'] = df['tr'].rolling(atr_period).mean()
-        
+        atr = true_range.ewm(alpha=1/self.atr_window, min_periods=self.atr_window).mean().to_numpy()
+
         # HL2 is simply the average of high and low prices
-        hl2 = (self.high + self.low) / 2
-        # upperband and lowerband calculation
-        # notice that final bands are set to be equal to the respective bands
-        final_upperband = upperband = hl2 + (self.atr_multi * atr)
-        final_lowerband = lowerband = hl2 - (self.atr_multi * atr)
-        
-        # initialize Supertrend column to True
-        supertrend = [True] * len(self.close)
-        
-        for i in range(1, len(self.close)):
-            curr, prev = i, i-1
-            
-            # if current close price crosses above upperband
-            if self.close[curr] > final_upperband[prev]:
-                supertrend[curr] = True
-            # if current close price crosses below lowerband
-            elif self.close[curr] < final_lowerband[prev]:
-                supertrend[curr] = False
-            # else, the trend continues
-            else:
-                supertrend[curr] = supertrend[prev]
-                
-                # adjustment to the final bands
-                if supertrend[curr] == True and final_lowerband[curr] < final_lowerband[prev]:
-                    final_lowerband[curr] = final_lowerband[prev]
-                if supertrend[curr] == False and final_upperband[curr] > final_upperband[prev]:
-                    final_upperband[curr] = final_upperband[prev]
-
-            # to remove bands according to the trend direction
-            if supertrend[curr] == True:
-                final_upperband[curr] = np.nan
-            else:
-                final_lowerband[curr] = np.nan
-                
+        hl2 = (high + low) / 2
+        supertrend, final_upperband, final_lowerband = _super_trend_kernel(
+            close, hl2 + (self.atr_multi * atr), hl2 - (self.atr_multi * atr)
+        )
+
         self.st = pd.DataFrame({
             'Supertrend': supertrend,
             'Final Lowerband': final_lowerband,
             'Final Upperband': final_upperband
-        })
-        
+        }, index=self.close.index)
+
     def super_trend_upper(self):
         return self.st['Final Upperband']
-        
+
     def super_trend_lower(self):
         return self.st['Final Lowerband']
-        
+
     def super_trend_direction(self):
         return self.st['Supertrend']
-    
+
+
+def super_trend_batch(high, low, close, atr_windows=(10,), atr_multis=(3,)):
+    """ SuperTrend of many symbols and ATR parameter sets in one call
+
+        Args:
+            high(pd.DataFrame): time x symbol 'high' prices,
+            low(pd.DataFrame): time x symbol 'low' prices,
+            close(pd.DataFrame): time x symbol 'close' prices,
+            atr_windows(list): ATR windows to compute,
+            atr_multis(list): ATR multipliers to compute
+
+        Returns:
+            tuple(pd.DataFrame): direction, final upperband and final lowerband, with
+                (symbol, atr_window, atr_multi) columns
+    """
+    high_values = high.to_numpy(dtype=np.float64)
+    low_values = low.to_numpy(dtype=np.float64)
+    close_values = close.to_numpy(dtype=np.float64)
+    true_range = pd.DataFrame(_true_range(high_values, low_values, close_values))
+    hl2 = (high_values + low_values) / 2
+
+    columns, upperbands, lowerbands, closes = [], [], [], []
+    for atr_window in atr_windows:
+        atr = true_range.ewm(alpha=1/atr_window, min_periods=atr_window).mean().to_numpy()
+        for atr_multi in atr_multis:
+            upperbands.append(hl2 + atr_multi * atr)
+            lowerbands.append(hl2 - atr_multi * atr)
+            closes.append(close_values)
+            columns += [(symbol, atr_window, atr_multi) for symbol in close.columns]
+    supertrend, final_upperband, final_lowerband = _super_trend_kernel_2d(
+        np.hstack(closes), np.hstack(upperbands), np.hstack(lowerbands)
+    )
+
+    columns = pd.MultiIndex.from_tuples(columns, names=["symbol", "atr_window", "atr_multi"])
+    return (
+        pd.DataFrame(supertrend, index=close.index, columns=columns),
+        pd.DataFrame(final_upperband, index=close.index, columns=columns),
+        pd.DataFrame(final_lowerband, index=close.index, columns=columns),
+    )
+
+
+def _adaptive_ema(values, alphas):
+    """ Time-varying-alpha recursive filter: ma[i] = ma[i-1] + alphas[i] * (values[i] - ma[i-1])
+
+        The filter starts from ma[-1] = 0, single pass over float64 buffers.
+    """
+    values = np.asarray(values, dtype=np.float64).tolist()
+    alphas = np.asarray(alphas, dtype=np.float64).tolist()
+    ma = [0.0] * len(values)
+    prev = 0.0
+    for i in range(len(values)):
+        prev = prev + alphas[i] * (values[i] - prev)
+        ma[i] = prev
+    return np.array(ma)
+
+
 class MaSlope():
     """ Slope adaptative moving average
+
+        Args:
+            keep_columns(bool): keep the intermediate columns (hh, ll, mult, final, ...) in self.df
     """
 
     def __init__(
@@ -345,7 +442,8 @@ class MaSlope():
         major_length: int = 14,
         minor_length: int = 6,
         slope_period: int = 34,
-        slope_ir: int = 25
+        slope_ir: int = 25,
+        keep_columns: bool = False
     ):
         self.close = close
         self.high = high
@@ -355,38 +453,41 @@ class MaSlope():
         self.minor_length = minor_length
         self.slope_period = slope_period
         self.slope_ir = slope_ir
+        self.keep_columns = keep_columns
         self._run()
 
     def _run(self):
         minAlpha = 2 / (self.minor_length + 1)
         majAlpha = 2 / (self.major_length + 1)
-        # df = pd.DataFrame(data = [self.close, self.high, self.low], columns = ['close','high','low'])
-        df = pd.DataFrame(data = {"close": self.close, "high": self.high, "low":self.low})
-        df['hh'] = df['high'].rolling(window=self.long_ma+1).max()
-        df['ll'] = df['low'].rolling(window=self.long_ma+1).min()
-        df = df.fillna(0)
-        df.loc[df['hh'] == df['ll'],'mult'] = 0
-        df.loc[df['hh'] != df['ll'],'mult'] = abs(2 * df['close'] - df['ll'] - df['hh']) / (df['hh'] - df['ll'])
-        df['final'] = df['mult'] * (minAlpha - majAlpha) + majAlpha
-
-        ma_first = (df.iloc[0]['final']**2) * df.iloc[0]['close']
-
-        col_ma = [ma_first]
-        for i in range(1, len(df)):
-            ma1 = col_ma[i-1]
-            col_ma.append(ma1 + (df.iloc[i]['final']**2) * (df.iloc[i]['close'] - ma1))
-
-        df['ma'] = col_ma
-        pi = math.atan(1) * 4
-        df['hh1'] = df['high'].rolling(window=self.slope_period).max()
-        df['ll1'] = df['low'].rolling(window=self.slope_period).min()
-        df['slope_range'] = self.slope_ir / (df['hh1'] - df['ll1']) * df['ll1']
-        df['dt'] = (df['ma'].shift(2) - df['ma']) / df['close'] * df['slope_range'] 
-        df['c'] = (1+df['dt']*df['dt'])**0.5
-        df['xangle'] = round(180*np.arccos(1/df['c']) / pi)
-        df.loc[df['dt']>0,"xangle"] = - df['xangle']
-        self.df = df
-        # print(df)
+        close = np.nan_to_num(self.close.to_numpy(dtype=np.float64), nan=0.0)
+        high = np.nan_to_num(self.high.to_numpy(dtype=np.float64), nan=0.0)
+        low = np.nan_to_num(self.low.to_numpy(dtype=np.float64), nan=0.0)
+        hh = np.nan_to_num(self.high.rolling(window=self.long_ma+1).max().to_numpy(dtype=np.float64), nan=0.0)
+        ll = np.nan_to_num(self.low.rolling(window=self.long_ma+1).min().to_numpy(dtype=np.float64), nan=0.0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mult = np.where(hh == ll, 0.0, np.abs(2 * close - ll - hh) / (hh - ll))
+            final = mult * (minAlpha - majAlpha) + majAlpha
+            ma = _adaptive_ema(close, final ** 2)
+
+            pi = math.atan(1) * 4
+            hh1 = pd.Series(high).rolling(window=self.slope_period).max().to_numpy()
+            ll1 = pd.Series(low).rolling(window=self.slope_period).min().to_numpy()
+            slope_range = self.slope_ir / (hh1 - ll1) * ll1
+            ma_n2 = np.concatenate([[np.nan, np.nan], ma[:-2]])[:len(ma)]
+            dt = (ma_n2 - ma) / close * slope_range
+            c = (1 + dt * dt) ** 0.5
+            xangle = np.round(180 * np.arccos(1 / c) / pi)
+        xangle = np.where(dt > 0, -xangle, xangle)
+
+        columns = {"ma": ma, "xangle": xangle}
+        if self.keep_columns:
+            columns = {
+                "close": close, "high": high, "low": low, "hh": hh, "ll": ll,
+                "mult": mult, "final": final, "ma": ma, "hh1": hh1, "ll1": ll1,
+                "slope_range": slope_range, "dt": dt, "c": c, "xangle": xangle,
+            }
+        self.df = pd.DataFrame(columns, index=self.close.index)
 
     def ma_line(self) -> pd.Series:
         """ ma_line
@@ -403,5 +504,3 @@ class MaSlope():
                 pd.Series: x_angle
         """
         return self.df['xangle']
-        
-    
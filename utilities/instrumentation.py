@@ -0,0 +1,239 @@
+import inspect
+import json
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _max_rss():
+    # Pic de mémoire résidente du processus, en octets (ru_maxrss est en kilo-octets sous Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RunMetrics():
+    """ Per-stage telemetry of one strategy run
+
+        Every stage records its duration, the number of HTTP requests and bytes exchanged by the
+        instrumented ccxt sessions and the peak resident memory of the process when it ended.
+        With trace_memory, the peak of memory traced by tracemalloc while it ran is added.
+        Requests are also aggregated per endpoint into a latency histogram. Stages are written as
+        JSON lines when they end, and the whole run as a Prometheus text file by finish().
+
+        Usage:
+            metrics = RunMetrics("strategy_multi_bitget", jsonl_path="metrics.jsonl")
+            bitget = PerpBitget(..., metrics=metrics)
+            metrics.begin("ohlcv")
+            ...
+            metrics.begin("indicators")  # termine le stage précédent
+            ...
+            metrics.finish()
+
+        Args:
+            name(str): name of the strategy, label of every metric,
+            jsonl_path(str): file the stage records are appended to, None to disable,
+            prometheus_path(str): Prometheus text file rewritten by finish(), None to disable,
+            trace_memory(bool): measure the peak memory of every stage with tracemalloc (slows
+                down allocation heavy code, and so the durations measured), tracing is stopped by
+                finish() when it was started here,
+            buckets(tuple): upper bounds in seconds of the latency histogram
+    """
+
+    def __init__(self, name, jsonl_path=None, prometheus_path=None, trace_memory=False, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.trace_memory = trace_memory
+        self.buckets = tuple(buckets)
+        self._started_tracing = False
+        self.reset()
+
+    def reset(self):
+        """ Start a new run with the same instrumented sessions, for processes running several times
+        """
+        self.run_id = f"{int(time.time() * 1000)}-{os.getpid()}"
+        self.requests = 0
+        self.bytes = 0
+        self.endpoints = {}
+        self.stages = []
+        self._current = None
+
+    # Sessions ccxt
+
+    def instrument(self, session):
+        """ Count and time every HTTP request of a sync or async ccxt exchange
+
+            The exchange's fetch method is wrapped on the instance, bytes are the request body plus
+            the response text (last_http_response).
+        """
+        fetch = session.fetch
+
+        def measure(url, body, start):
+            latency = time.perf_counter() - start
+            self.requests += 1
+            self.bytes += len(body or "") + len(session.last_http_response or "")
+            self._observe(urlparse(url).path, latency)
+
+        if inspect.iscoroutinefunction(fetch):
+            async def timed_fetch(url, method="GET", headers=None, body=None):
+                start = time.perf_counter()
+                try:
+                    return await fetch(url, method, headers, body)
+                finally:
+                    measure(url, body, start)
+        else:
+            def timed_fetch(url, method="GET", headers=None, body=None):
+                start = time.perf_counter()
+                try:
+                    return fetch(url, method, headers, body)
+                finally:
+                    measure(url, body, start)
+        session.fetch = timed_fetch
+        return session
+
+    @contextmanager
+    def instrumented(self, session):
+        """ Instrument a session shared with other runs only for the duration of a block
+        """
+        own_fetch = "fetch" in vars(session)
+        fetch = session.fetch
+        self.instrument(session)
+        try:
+            yield session
+        finally:
+            if own_fetch:
+                session.fetch = fetch
+            else:
+                del session.fetch
+
+    def _observe(self, endpoint, latency):
+        histogram = self.endpoints.setdefault(endpoint, {"count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets)})
+        histogram["count"] += 1
+        histogram["sum"] += latency
+        for i, bound in enumerate(self.buckets):
+            if latency <= bound:
+                histogram["buckets"][i] += 1
+
+    # Stages
+
+    def begin(self, stage):
+        """ Start a stage, ending the current one if any
+        """
+        self.end()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        self._current = {
+            "stage": stage,
+            "start": time.time(),
+            "perf": time.perf_counter(),
+            "requests": self.requests,
+            "bytes": self.bytes,
+        }
+
+    def end(self):
+        """ End the current stage and write its record
+        """
+        if self._current is None:
+            return None
+        current, self._current = self._current, None
+        record = {
+            "run_id": self.run_id,
+            "strategy": self.name,
+            "stage": current["stage"],
+            "start": current["start"],
+            "duration": time.perf_counter() - current["perf"],
+            "api_calls": self.requests - current["requests"],
+            "bytes": self.bytes - current["bytes"],
+            "peak_memory": tracemalloc.get_traced_memory()[1] if self.trace_memory else None,
+            "max_rss": _max_rss(),
+        }
+        self.stages.append(record)
+        self._write_jsonl(record)
+        return record
+
+    @contextmanager
+    def stage(self, stage):
+        self.begin(stage)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def finish(self):
+        """ End the current stage, write the endpoint histograms and the Prometheus file
+        """
+        self.end()
+        for endpoint, histogram in self.endpoints.items():
+            self._write_jsonl({"run_id": self.run_id, "strategy": self.name, "endpoint": endpoint, **histogram})
+        self._write_jsonl({
+            "run_id": self.run_id,
+            "strategy": self.name,
+            "stage": "total",
+            "duration": sum(record["duration"] for record in self.stages),
+            "api_calls": self.requests,
+            "bytes": self.bytes,
+            "max_rss": _max_rss(),
+        })
+        if self.prometheus_path is not None:
+            self.write_prometheus(self.prometheus_path)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    # Sorties
+
+    def _write_jsonl(self, record):
+        if self.jsonl_path is None:
+            return
+        directory = os.path.dirname(self.jsonl_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.jsonl_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def prometheus_text(self):
+        """ Metrics of the run in the Prometheus text exposition format
+        """
+        strategy = f'strategy="{self.name}"'
+        lines = []
+        gauges = [
+            ("strategy_stage_duration_seconds", "Duration of the stage", "duration"),
+            ("strategy_stage_api_calls", "HTTP requests sent during the stage", "api_calls"),
+            ("strategy_stage_bytes", "Bytes exchanged during the stage", "bytes"),
+            ("strategy_stage_peak_memory_bytes", "Peak traced memory during the stage", "peak_memory"),
+            ("strategy_stage_max_rss_bytes", "Peak resident memory of the process at the end of the stage", "max_rss"),
+        ]
+        for metric, description, key in gauges:
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} gauge")
+            for record in self.stages:
+                if record[key] is not None:
+                    lines.append(f'{metric}{{{strategy},stage="{record["stage"]}"}} {record[key]}')
+        metric = "exchange_request_duration_seconds"
+        lines.append(f"# HELP {metric} Latency of the HTTP requests per endpoint")
+        lines.append(f"# TYPE {metric} histogram")
+        for endpoint, histogram in self.endpoints.items():
+            labels = f'{strategy},endpoint="{endpoint}"'
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram['sum']}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # Réécriture atomique, lisible à tout moment par le textfile collector de node_exporter
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = path + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_file, path)
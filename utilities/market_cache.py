@@ -0,0 +1,43 @@
+import json
+import os
+import time
+
+
+class MarketCache():
+    """ On-disk cache of a ccxt market table
+
+        Args:
+            path(str): json file holding the markets and currencies
+            ttl(int): validity of the cache in seconds
+    """
+
+    def __init__(self, path, ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+
+    def is_fresh(self, timestamp):
+        return timestamp is not None and time.time() - timestamp <= self.ttl
+
+    def load(self):
+        """ Returns:
+                dict: {"timestamp", "markets", "currencies"}, None if the cache is missing or expired
+        """
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self.is_fresh(data.get("timestamp")):
+            return None
+        return data
+
+    def save(self, markets, currencies):
+        timestamp = time.time()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"timestamp": timestamp, "markets": markets, "currencies": currencies}, f)
+        os.replace(tmp_file, self.path)
+        return timestamp
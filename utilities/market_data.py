@@ -0,0 +1,135 @@
+import asyncio
+import time
+from contextlib import nullcontext
+import ccxt
+import ccxt.async_support as ccxt_async
+from utilities.ohlcv_store import OhlcvStore
+from utilities.perp_bitget_async import AsyncPerpBitget
+
+# Services partagés du processus, un par stockage local
+_services = {}
+
+
+def get_market_data(store_path, market_cache_path=None, **kwargs):
+    """ MarketDataService of the process for a store, created on first use
+
+        Every strategy run by the scheduler, and every account of a strategy, asking for the same
+        store gets the same service, so a candle or a ticker is downloaded once per process.
+
+        Args:
+            kwargs: other arguments of MarketDataService, used when the service is created
+    """
+    if store_path not in _services:
+        _services[store_path] = MarketDataService(store_path, market_cache_path, **kwargs)
+    return _services[store_path]
+
+
+def close_market_data():
+    """ Close the services created by get_market_data
+    """
+    while _services:
+        _services.popitem()[1].close()
+
+
+class MarketDataService():
+    """ Public market data (OHLCV, tickers) downloaded once and shared by strategies and accounts
+
+        In the process, the candles of the current period are kept in memory after the first fetch
+        and the tickers for ticker_ttl seconds. Between processes, the OhlcvStore files are the
+        shared cache: a symbol whose file was rewritten during the current candle less than max_age
+        seconds ago is read (memory-mapped) from disk without any request. Callers get copies, they
+        may add columns to their DataFrames.
+
+        Args:
+            store_path(str): directory of the OhlcvStore shared by all the processes,
+            market_cache_path(str): market table cache of the AsyncPerpBitget client,
+            max_age(float): age in seconds above which candles of the current period are refetched,
+            ticker_ttl(float): seconds during which fetched tickers are reused,
+            max_concurrency(int), record_path(str), replay_path(str): AsyncPerpBitget options
+    """
+
+    def __init__(self, store_path, market_cache_path=None, max_age=300, ticker_ttl=10, max_concurrency=10,
+                 record_path=None, replay_path=None):
+        self.max_age = max_age
+        self.ticker_ttl = ticker_ttl
+        self._loop = asyncio.new_event_loop()
+        self._client = AsyncPerpBitget(
+            store_path=store_path,
+            market_cache_path=market_cache_path,
+            max_concurrency=max_concurrency,
+            record_path=record_path,
+            replay_path=replay_path,
+        )
+        self._loop.run_until_complete(self._client.load_markets())
+        self._store = OhlcvStore(store_path)
+        self._frames = {}
+        self._tickers = {}
+        self.fetches = {"ohlcv": 0, "tickers": 0}
+
+    def _measured(self, metrics):
+        # Requêtes comptées dans les mesures de la stratégie appelante, le client étant partagé
+        session = self._client._session
+        if metrics is None or not isinstance(session, ccxt_async.Exchange):
+            return nullcontext()
+        return metrics.instrumented(session)
+
+    def _fresh(self, fetched_at, now, timeframe_in_seconds):
+        return fetched_at >= now // timeframe_in_seconds * timeframe_in_seconds and now - fetched_at <= self.max_age
+
+    def get_ohlcv(self, symbols, timeframe, limit, metrics=None):
+        """ Last `limit` candles (running one included) of every symbol
+
+            Args:
+                metrics(RunMetrics): run the requests made for this call are counted in
+
+            Returns:
+                dict: symbol -> OHLCV DataFrame, empty DataFrame for symbols in error
+        """
+        now = time.time()
+        timeframe_in_seconds = ccxt.Exchange.parse_timeframe(timeframe)
+        frames = {}
+        missing = []
+        for symbol in symbols:
+            cached = self._frames.get((symbol, timeframe))
+            if cached is not None and self._fresh(cached[0], now, timeframe_in_seconds) and len(cached[1]) >= limit:
+                frames[symbol] = cached[1].iloc[-limit:]
+                continue
+            modified = self._store.modified_time(symbol, timeframe)
+            if modified is not None and self._fresh(modified, now, timeframe_in_seconds):
+                # Ouverture de la plus ancienne des `limit` dernières bougies, bougie en cours incluse
+                start = (int(now) // timeframe_in_seconds - limit + 1) * timeframe_in_seconds * 1000
+                df = self._store.read(symbol, timeframe, start, limit)
+                if len(df) == limit:
+                    self._frames[symbol, timeframe] = (modified, df)
+                    frames[symbol] = df
+                    continue
+            missing.append(symbol)
+
+        if missing:
+            with self._measured(metrics):
+                fetched = self._loop.run_until_complete(self._client.fetch_many_historical(missing, timeframe, limit))
+            self.fetches["ohlcv"] += len(missing)
+            for symbol, df in fetched.items():
+                if len(df) > 0:
+                    self._frames[symbol, timeframe] = (now, df)
+                frames[symbol] = df
+        return {symbol: frames[symbol].copy() for symbol in symbols}
+
+    def get_tickers(self, symbols, metrics=None):
+        """ Tickers of the symbols, fetched together when one of them is older than ticker_ttl
+
+            Returns:
+                dict: symbol -> ccxt ticker
+        """
+        now = time.time()
+        if any(symbol not in self._tickers or now - self._tickers[symbol][0] > self.ticker_ttl for symbol in symbols):
+            with self._measured(metrics):
+                tickers = self._loop.run_until_complete(self._client.get_tickers(list(symbols)))
+            self.fetches["tickers"] += 1
+            for symbol, ticker in tickers.items():
+                self._tickers[symbol] = (now, ticker)
+        return {symbol: self._tickers[symbol][1] for symbol in symbols if symbol in self._tickers}
+
+    def close(self):
+        self._loop.run_until_complete(self._client.close())
+        self._loop.close()
@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def ohlcv_to_df(data):
+    """ Convert raw ccxt OHLCV rows (list or ndarray) to the usual timestamp indexed DataFrame
+    """
+    data = np.asarray(data, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+    df = pd.DataFrame(data[:, 1:], columns=OHLCV_COLUMNS[1:])
+    df.index = pd.to_datetime(data[:, 0].astype(np.int64), unit='ms')
+    df.index.name = 'timestamp'
+    return df
+
+
+class OhlcvStore():
+    """ On-disk candle store, one float64 NumPy file per symbol/timeframe
+
+        Rows are [timestamp, open, high, low, close, volume], sorted by timestamp.
+        Files are read memory-mapped and rewritten atomically on every update.
+
+        Args:
+            path(str): directory holding the candle files
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, symbol, timeframe):
+        name = symbol.replace("/", "-").replace(":", "_")
+        return os.path.join(self.path, f"{name}_{timeframe}.npy")
+
+    def load(self, symbol, timeframe):
+        file = self._file(symbol, timeframe)
+        if not os.path.exists(file):
+            return np.empty((0, len(OHLCV_COLUMNS)), dtype=np.float64)
+        return np.load(file, mmap_mode='r')
+
+    def modified_time(self, symbol, timeframe):
+        """ Time (in seconds) of the last write of a symbol/timeframe, None if nothing is stored
+        """
+        file = self._file(symbol, timeframe)
+        return os.path.getmtime(file) if os.path.exists(file) else None
+
+    def last_timestamp(self, symbol, timeframe):
+        data = self.load(symbol, timeframe)
+        return int(data[-1, 0]) if len(data) > 0 else None
+
+    def fetch_start(self, symbol, timeframe, start):
+        """ Timestamp from which candles must be downloaded to cover `start` up to now
+
+            The last stored candle is always refetched since it may have been stored unfinished.
+        """
+        stored = self.load(symbol, timeframe)
+        if len(stored) > 0 and stored[0, 0] <= start <= stored[-1, 0]:
+            return int(stored[-1, 0])
+        return start
+
+    def read(self, symbol, timeframe, start, limit):
+        stored = self.load(symbol, timeframe)
+        first = stored[:, 0].searchsorted(start)
+        return ohlcv_to_df(stored[first:][-limit:])
+
+    def append(self, symbol, timeframe, rows):
+        """ Merge new rows into the store
+
+            Stored rows with a timestamp >= the first new timestamp are replaced, so the
+            last (possibly unfinished) candle can be refetched and overwritten.
+
+            Returns:
+                np.ndarray: the merged candles
+        """
+        new = np.asarray(rows, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+        old = self.load(symbol, timeframe)
+        if len(new) == 0:
+            return old
+        keep = np.searchsorted(old[:, 0], new[0, 0], side='left')
+        merged = np.concatenate([old[:keep], new])
+        file = self._file(symbol, timeframe)
+        tmp_file = file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            np.save(f, merged)
+        os.replace(tmp_file, file)
+        return merged
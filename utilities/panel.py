@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+
+def build_panel(df_list, column="close", fill=None):
+    """ Align one column of every DataFrame on a common timestamp index
+
+        Args:
+            df_list(dict): symbol -> OHLCV DataFrame indexed by timestamp,
+            column(str): column to extract,
+            fill(str): missing data policy, None keeps NaN where a symbol has no candle,
+                "ffill" carries the last known value forward (leading NaN are kept)
+
+        Returns:
+            pd.DataFrame: time x symbol panel (outer join of all timestamps)
+    """
+    if len(df_list) == 0:
+        return pd.DataFrame()
+    panel = pd.concat({symbol: df[column] for symbol, df in df_list.items()}, axis=1, join="outer")
+    panel = panel.sort_index()
+    if fill == "ffill":
+        panel = panel.ffill()
+    elif fill is not None:
+        raise ValueError(f"Invalid fill policy: {fill}")
+    return panel
+
+
+def group_by_param(symbols, params, key):
+    """ Column positions of the symbols sharing the same value of params[symbol][key]
+
+        Returns:
+            dict: value -> list of column positions
+    """
+    groups = {}
+    for position, symbol in enumerate(symbols):
+        groups.setdefault(params[symbol][key], []).append(position)
+    return groups
+
+
+def _on_valid_rows(values, compute):
+    """ Apply `compute` to every column over its own non-NaN rows, NaN where values is NaN
+
+        A symbol missing a candle in the outer-joined panel is then computed as on its own
+        DataFrame: the gap is skipped instead of blanking the following windows.
+
+        Args:
+            values(np.array): time x ... array, trailing dimensions being flattened into columns,
+            compute(function): 2-D array -> list of 2-D arrays of the same shape, NaN only leading
+
+        Returns:
+            list: arrays of the shape of values, one per array returned by compute
+    """
+    shape = values.shape
+    block = values.reshape(shape[0], int(np.prod(shape[1:])))
+    valid = ~np.isnan(block)
+    if not valid.any():
+        return [np.full(shape, np.nan) for _ in compute(block[:0])]
+    count = valid.sum(axis=0)
+    first = valid.argmax(axis=0)
+    last = len(block) - 1 - valid[::-1].argmax(axis=0)
+    contiguous = count == last - first + 1
+    results = []
+
+    # Colonnes sans trou (NaN en tête ou en fin seulement) : calcul groupé sur le bloc
+    columns = np.flatnonzero(contiguous & (count > 0))
+    if len(columns) > 0:
+        outputs = compute(block[:, columns])
+        results = [np.full(block.shape, np.nan) for _ in outputs]
+        for result, output in zip(results, outputs):
+            result[:, columns] = output
+    # Colonnes avec des bougies manquantes : calcul sur les seules lignes valides
+    for column in np.flatnonzero(~contiguous & (count > 0)):
+        rows = valid[:, column]
+        outputs = compute(block[rows, column][:, None])
+        if not results:
+            results = [np.full(block.shape, np.nan) for _ in outputs]
+        for result, output in zip(results, outputs):
+            result[rows, column] = output[:, 0]
+    for result in results:
+        result[~valid] = np.nan
+    return [result.reshape(shape) for result in results]
+
+
+def rolling_mean(values, window, columns=None):
+    """ Rolling mean of selected columns of a time x symbol array, NaN until `window` valid values
+
+        Same computation as ta.trend.sma_indicator on every column, missing candles being skipped.
+    """
+    block = values if columns is None else values[:, columns]
+    return _on_valid_rows(block, lambda part: [
+        pd.DataFrame(part).rolling(window, min_periods=window).mean().to_numpy()
+    ])[0]
+
+
+def rolling_mean_std(values, window, columns=None):
+    """ Rolling mean and population std of selected columns, as ta.volatility.BollingerBands
+    """
+    block = values if columns is None else values[:, columns]
+
+    def compute(part):
+        rolling = pd.DataFrame(part).rolling(window, min_periods=window)
+        return [rolling.mean().to_numpy(), rolling.std(ddof=0).to_numpy()]
+
+    mean, std = _on_valid_rows(block, compute)
+    return mean, std
+
+
+def lag(values, n=1):
+    """ Shift every column of a time x ... array by `n` of its own valid rows, as DataFrame.shift(n)
+        on each symbol's DataFrame
+    """
+    def compute(part):
+        lagged = np.full(part.shape, np.nan)
+        if n < len(part):
+            lagged[n:] = part[:len(part) - n]
+        return [lagged]
+
+    return _on_valid_rows(np.asarray(values, dtype=np.float64), compute)[0]
@@ -1,15 +1,71 @@
 import ccxt
 import pandas as pd
 import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from utilities.ohlcv_store import OhlcvStore, ohlcv_to_df
+from utilities.market_cache import MarketCache
+from utilities.session_recorder import SessionRecorder, ReplaySession
+
+@dataclass(frozen=True)
+class MarketSnapshot():
+    """ Immutable view of the account and the market at one point in time
+
+        Args:
+            timestamp(int): time of the snapshot in ms
+            usdt_equity(float): total USDT of the account
+            positions(tuple): open positions, as returned by get_open_position
+            tickers(Mapping): symbol -> ccxt ticker
+            balance(Mapping): coin -> total balance
+    """
+    timestamp: int
+    usdt_equity: float
+    positions: tuple
+    tickers: MappingProxyType
+    balance: MappingProxyType
+
+    def last_price(self, symbol):
+        return float(self.tickers[symbol]["last"])
+
+
+class CachedMarketsBitget(ccxt.bitget):
+    """ ccxt.bitget reading its market table from a MarketCache while it is fresh
+
+        The markets are still loaded lazily by ccxt on first use, the network is only hit
+        when the cache is missing or expired, or on an explicit reload.
+    """
+    market_cache = None
+    markets_timestamp = None
+
+    def load_markets(self, reload=False, params={}):
+        if not reload and not self.markets and self.market_cache is not None:
+            cached = self.market_cache.load()
+            if cached is not None:
+                self.markets_timestamp = cached["timestamp"]
+                return self.set_markets(cached["markets"], cached["currencies"])
+        downloaded = reload or not self.markets
+        markets = super().load_markets(reload, params)
+        if downloaded and self.market_cache is not None:
+            self.markets_timestamp = self.market_cache.save(self.markets, self.currencies)
+        return markets
+
+    def markets_expired(self):
+        return self.market_cache is not None and not self.market_cache.is_fresh(self.markets_timestamp)
+
 
 class PerpBitget():
-    def __init__(self, apiKey=None, secret=None, password=None):
+    # Taille de page maximale de bitget sur l'endpoint historique (1000 sur l'endpoint récent)
+    ohlcv_page_size = 200
+    ohlcv_max_retries = 3
+    ohlcv_retry_delay = 0.5
+
+    def __init__(self, apiKey=None, secret=None, password=None, store_path=None, market_cache_path=None, market_cache_ttl=24 * 3600, record_path=None, replay_path=None, metrics=None):
         if apiKey is None or secret is None or password is None:
             self._auth = False
-            self._session = ccxt.bitget()
+            self._session = CachedMarketsBitget()
         else:
             self._auth = True
-            self._session = ccxt.bitget({
+            self._session = CachedMarketsBitget({
                 "apiKey": apiKey,
                 "secret": secret,
                 "password": password,
@@ -19,7 +75,30 @@ class PerpBitget():
                 },
                 'verbose': False,
             })
-        self.market = self._session.load_markets()
+        # Les marchés ne sont plus chargés ici mais au premier besoin, depuis le cache disque si possible
+        if market_cache_path is not None:
+            self._session.market_cache = MarketCache(market_cache_path, market_cache_ttl)
+        # Mesure des requêtes HTTP (nombre, octets, latence par endpoint) dans un RunMetrics
+        if metrics is not None and replay_path is None:
+            metrics.instrument(self._session)
+        # Enregistrement de tous les appels à l'échange, ou rejeu d'un enregistrement sans réseau
+        if replay_path is not None:
+            self._auth = True
+            self._session = ReplaySession(replay_path)
+        elif record_path is not None:
+            self._session = SessionRecorder(self._session, record_path)
+        # Stockage local des bougies, None pour tout retélécharger à chaque appel
+        self._store = OhlcvStore(store_path) if store_path is not None else None
+
+    @property
+    def market(self):
+        return self._session.load_markets()
+
+    def _ensure_market(self, symbol):
+        # Rechargement forcé uniquement si le symbole est inconnu ou si le cache a expiré
+        markets = self._session.load_markets()
+        if symbol not in markets or self._session.markets_expired():
+            self._session.load_markets(reload=True)
 
     def authentication_required(fn):
         def wrapped(self, *args, **kwargs):
@@ -44,27 +123,67 @@ class PerpBitget():
         df.set_index('timestamp', inplace=True)
         return df
 
+    def _aligned_start(self, timeframe, limit):
+        # Ouverture de la plus ancienne des `limit` dernières bougies (bougie en cours incluse)
+        timeframe_in_ms = self._session.parse_timeframe(timeframe) * 1000
+        return (self._session.milliseconds() // timeframe_in_ms - limit + 1) * timeframe_in_ms
+
     def get_more_last_historical(self, symbol, timeframe, limit):
-        batch_size = 100
-        timeframe_in_seconds = self._session.parse_timeframe(timeframe)
-        total_iterations = int((limit + batch_size - 1) / batch_size)
+        if self._store is not None:
+            return self.get_stored_historical(symbol, timeframe, limit)
+        data = self._fetch_ohlcv_since(symbol, timeframe, self._aligned_start(timeframe, limit))
+        return ohlcv_to_df(data[-limit:])
+
+    def get_stored_historical(self, symbol, timeframe, limit):
+        # Lecture du stockage local puis récupération des seules bougies manquantes
+        start = self._aligned_start(timeframe, limit)
+        since = self._store.fetch_start(symbol, timeframe, start)
+        data = self._fetch_ohlcv_since(symbol, timeframe, since)
+        self._store.append(symbol, timeframe, data)
+        return self._store.read(symbol, timeframe, start, limit)
+
+    def _fetch_ohlcv_since(self, symbol, timeframe, since):
+        # Pagination exacte : chaque page commence juste après la dernière bougie reçue
+        timeframe_in_ms = self._session.parse_timeframe(timeframe) * 1000
+        now = self._session.milliseconds()
         all_data = []
-        for i in range(total_iterations):
-            since = int(time.time() * 1000) - ((i + 1) * batch_size * timeframe_in_seconds * 1000)
+        while since <= now:
+            data = self._fetch_ohlcv_page(symbol, timeframe, since)
+            if len(data) == 0:
+                if since + self.ohlcv_page_size * timeframe_in_ms > now:
+                    break
+                # Aucune bougie sur toute la fenêtre, on passe à la suivante
+                self._report_gap(symbol, since, since + self.ohlcv_page_size * timeframe_in_ms, timeframe_in_ms)
+                since += self.ohlcv_page_size * timeframe_in_ms
+                continue
+            self._check_gaps(symbol, since, data, timeframe_in_ms)
+            all_data.extend(data)
+            since = data[-1][0] + timeframe_in_ms
+        return all_data
+
+    def _fetch_ohlcv_page(self, symbol, timeframe, since):
+        # Seule la page en erreur est redemandée, exception si tous les essais échouent :
+        # un historique tronqué ne doit pas être enregistré comme complet
+        for attempt in range(self.ohlcv_max_retries):
             try:
-                data = self._session.fetch_ohlcv(symbol, timeframe, since=since, limit=batch_size)
-                all_data.extend(data)
+                data = self._session.fetch_ohlcv(symbol, timeframe, since=since, limit=self.ohlcv_page_size)
+                return [row for row in data if row[0] >= since]
             except Exception as err:
-                print(f"Erreur lors de la récupération des données pour {symbol}: {type(err).__name__} - {err}")
-                time.sleep(1)
-        # Supprimer les doublons et trier
-        all_data = list({tuple(row) for row in all_data})
-        all_data.sort()
-        df = pd.DataFrame(all_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df.set_index('timestamp', inplace=True)
-        df.sort_index(inplace=True)
-        return df
+                print(f"Erreur lors de la récupération des données pour {symbol} (essai {attempt + 1}/{self.ohlcv_max_retries}): {type(err).__name__} - {err}")
+                if attempt + 1 < self.ohlcv_max_retries:
+                    time.sleep(self.ohlcv_retry_delay * 2 ** attempt)
+        raise Exception(f"Page {since} de {symbol} indisponible après {self.ohlcv_max_retries} essais")
+
+    def _check_gaps(self, symbol, since, data, timeframe_in_ms):
+        expected = since
+        for row in data:
+            if row[0] > expected:
+                self._report_gap(symbol, expected, row[0], timeframe_in_ms)
+            expected = row[0] + timeframe_in_ms
+
+    def _report_gap(self, symbol, start, end, timeframe_in_ms):
+        missing = int((end - start) // timeframe_in_ms)
+        print(f"Trou de {missing} bougies pour {symbol} à partir de {pd.to_datetime(start, unit='ms')}")
 
     def get_bid_ask_price(self, symbol):
         try:
@@ -74,13 +193,16 @@ class PerpBitget():
             raise Exception(err)
 
     def get_min_order_amount(self, symbol):
+        self._ensure_market(symbol)
         market = self._session.market(symbol)
         return market["limits"]["amount"]["min"]
 
     def convert_amount_to_precision(self, symbol, amount):
+        self._ensure_market(symbol)
         return self._session.amount_to_precision(symbol, amount)
 
     def convert_price_to_precision(self, symbol, price):
+        self._ensure_market(symbol)
         return self._session.price_to_precision(symbol, price)
 
     @authentication_required
@@ -190,6 +312,31 @@ class PerpBitget():
         except Exception as err:
             raise Exception("Une erreur s'est produite dans get_usdt_equity", err)
 
+    def get_tickers(self, symbols=None):
+        try:
+            return self._session.fetch_tickers(symbols)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans get_tickers", err)
+
+    @authentication_required
+    def snapshot(self, symbols=None, tickers=None):
+        # Tickers, positions et solde en 3 requêtes, au lieu d'un fetch_ticker par position.
+        # Des tickers déjà récupérés (MarketDataService partagé entre comptes) évitent la première.
+        try:
+            if tickers is None:
+                tickers = self._session.fetch_tickers(symbols)
+            positions = self.get_open_position()
+            balance_info = self._session.fetch_balance()
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans snapshot", err)
+        return MarketSnapshot(
+            timestamp=self._session.milliseconds(),
+            usdt_equity=float(balance_info['total'].get('USDT', 0.0)),
+            positions=tuple(positions),
+            tickers=MappingProxyType(tickers),
+            balance=MappingProxyType(balance_info['total']),
+        )
+
     @authentication_required
     def get_open_order(self, symbol, conditional=False):
         try:
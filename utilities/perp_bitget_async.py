@@ -0,0 +1,337 @@
+import asyncio
+import ccxt.async_support as ccxt_async
+from utilities.ohlcv_store import OhlcvStore, ohlcv_to_df
+from utilities.market_cache import MarketCache
+from utilities.session_recorder import SessionRecorder, ReplaySession
+from types import MappingProxyType
+from utilities.perp_bitget import PerpBitget, MarketSnapshot
+
+authentication_required = PerpBitget.authentication_required
+
+
+class CachedMarketsBitget(ccxt_async.bitget):
+    """ ccxt.async_support.bitget reading its market table from a MarketCache while it is fresh
+    """
+    market_cache = None
+    markets_timestamp = None
+
+    async def load_markets_helper(self, reload=False, params={}):
+        if not reload and not self.markets and self.market_cache is not None:
+            cached = self.market_cache.load()
+            if cached is not None:
+                self.markets_timestamp = cached["timestamp"]
+                return self.set_markets(cached["markets"], cached["currencies"])
+        downloaded = reload or not self.markets
+        markets = await super().load_markets_helper(reload, params)
+        if downloaded and self.market_cache is not None:
+            self.markets_timestamp = self.market_cache.save(self.markets, self.currencies)
+        return markets
+
+    def markets_expired(self):
+        return self.market_cache is not None and not self.market_cache.is_fresh(self.markets_timestamp)
+
+
+class AsyncPerpBitget(PerpBitget):
+    """ Asyncio version of PerpBitget built on ccxt.async_support
+
+        Same methods as PerpBitget, as coroutines. Precision and min amount helpers are
+        coroutines too, the market table being refreshed first when the symbol is unknown or
+        the cache has expired. get_hold_side is inherited unchanged.
+
+        Usage:
+            async with AsyncPerpBitget() as bitget:
+                df_list = await bitget.fetch_many_historical(symbols, "1h", 1000)
+
+        Args:
+            max_concurrency(int): maximum number of requests in flight, ccxt's rate limiter
+                still spaces them according to the exchange rate limit
+    """
+
+    def __init__(self, apiKey=None, secret=None, password=None, store_path=None, market_cache_path=None, market_cache_ttl=24 * 3600, max_concurrency=10, record_path=None, replay_path=None, metrics=None):
+        if apiKey is None or secret is None or password is None:
+            self._auth = False
+            self._session = CachedMarketsBitget({
+                'enableRateLimit': True,
+            })
+        else:
+            self._auth = True
+            self._session = CachedMarketsBitget({
+                "apiKey": apiKey,
+                "secret": secret,
+                "password": password,
+                'enableRateLimit': True,
+                'options': {
+                    'defaultType': 'swap',
+                },
+                'verbose': False,
+            })
+        if market_cache_path is not None:
+            self._session.market_cache = MarketCache(market_cache_path, market_cache_ttl)
+        # Mesure des requêtes HTTP (nombre, octets, latence par endpoint) dans un RunMetrics
+        if metrics is not None and replay_path is None:
+            metrics.instrument(self._session)
+        # Enregistrement de tous les appels à l'échange, ou rejeu d'un enregistrement sans réseau
+        if replay_path is not None:
+            self._auth = True
+            self._session = ReplaySession(replay_path)
+        elif record_path is not None:
+            self._session = SessionRecorder(self._session, record_path)
+        self._store = OhlcvStore(store_path) if store_path is not None else None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        await self.load_markets()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def market(self):
+        return self._session.markets
+
+    async def _ensure_market(self, symbol):
+        await self.refresh_markets([symbol])
+
+    async def load_markets(self):
+        return await self._session.load_markets()
+
+    async def refresh_markets(self, symbols=[]):
+        # Rechargement forcé si un symbole est inconnu ou si le cache a expiré
+        markets = await self._session.load_markets()
+        if any(symbol not in markets for symbol in symbols) or self._session.markets_expired():
+            await self._session.load_markets(reload=True)
+
+    async def close(self):
+        await self._session.close()
+
+    async def _call(self, method, *args, **kwargs):
+        async with self._semaphore:
+            return await getattr(self._session, method)(*args, **kwargs)
+
+    async def get_last_historical(self, symbol, timeframe, limit):
+        data = await self._call("fetch_ohlcv", symbol, timeframe, limit=limit)
+        return ohlcv_to_df(data)
+
+    async def _fetch_ohlcv_page(self, symbol, timeframe, since):
+        timeframe_in_ms = self._session.parse_timeframe(timeframe) * 1000
+        end = since + self.ohlcv_page_size * timeframe_in_ms
+        for attempt in range(self.ohlcv_max_retries):
+            try:
+                data = await self._call("fetch_ohlcv", symbol, timeframe, since=since, limit=self.ohlcv_page_size)
+                # On ne garde que la fenêtre demandée pour que les pages ne se chevauchent pas
+                return [row for row in data if since <= row[0] < end]
+            except Exception as err:
+                print(f"Erreur lors de la récupération des données pour {symbol} (essai {attempt + 1}/{self.ohlcv_max_retries}): {type(err).__name__} - {err}")
+                if attempt + 1 < self.ohlcv_max_retries:
+                    await asyncio.sleep(self.ohlcv_retry_delay * 2 ** attempt)
+        raise Exception(f"Page {since} de {symbol} indisponible après {self.ohlcv_max_retries} essais")
+
+    async def _fetch_ohlcv_since(self, symbol, timeframe, since):
+        # Fenêtres alignées et disjointes, téléchargées en parallèle
+        timeframe_in_ms = self._session.parse_timeframe(timeframe) * 1000
+        now = self._session.milliseconds()
+        pages = range(since, now + 1, self.ohlcv_page_size * timeframe_in_ms)
+        results = await asyncio.gather(
+            *[self._fetch_ohlcv_page(symbol, timeframe, page_since) for page_since in pages]
+        )
+        all_data = [row for page in results for row in page]
+        self._check_gaps(symbol, since, all_data, timeframe_in_ms)
+        return all_data
+
+    async def get_more_last_historical(self, symbol, timeframe, limit):
+        if self._store is not None:
+            return await self.get_stored_historical(symbol, timeframe, limit)
+        data = await self._fetch_ohlcv_since(symbol, timeframe, self._aligned_start(timeframe, limit))
+        return ohlcv_to_df(data[-limit:])
+
+    async def get_stored_historical(self, symbol, timeframe, limit):
+        # Lecture du stockage local puis récupération des seules bougies manquantes
+        start = self._aligned_start(timeframe, limit)
+        since = self._store.fetch_start(symbol, timeframe, start)
+        data = await self._fetch_ohlcv_since(symbol, timeframe, since)
+        self._store.append(symbol, timeframe, data)
+        return self._store.read(symbol, timeframe, start, limit)
+
+    async def fetch_many_historical(self, symbols, timeframe, limit):
+        """ Download the last `limit` candles of every symbol concurrently
+
+            Returns:
+                dict: symbol -> OHLCV DataFrame, empty DataFrame for symbols in error
+        """
+        await self.refresh_markets(symbols)
+
+        async def fetch_one(symbol):
+            try:
+                return await self.get_more_last_historical(symbol, timeframe, limit)
+            except Exception as err:
+                print(f"Erreur lors de la récupération des données pour {symbol}: {type(err).__name__} - {err}")
+                return ohlcv_to_df([])
+
+        results = await asyncio.gather(*[fetch_one(symbol) for symbol in symbols])
+        return dict(zip(symbols, results))
+
+    async def get_tickers(self, symbols=None):
+        try:
+            return await self._call("fetch_tickers", symbols)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans get_tickers", err)
+
+    async def get_bid_ask_price(self, symbol):
+        try:
+            ticker = await self._call("fetch_ticker", symbol)
+            return {"bid": ticker["bid"], "ask": ticker["ask"]}
+        except Exception as err:
+            raise Exception(err)
+
+    async def get_min_order_amount(self, symbol):
+        await self._ensure_market(symbol)
+        market = self._session.market(symbol)
+        return market["limits"]["amount"]["min"]
+
+    async def convert_amount_to_precision(self, symbol, amount):
+        await self._ensure_market(symbol)
+        return self._session.amount_to_precision(symbol, amount)
+
+    async def convert_price_to_precision(self, symbol, price):
+        await self._ensure_market(symbol)
+        return self._session.price_to_precision(symbol, price)
+
+    @authentication_required
+    async def place_limit_order(self, symbol, side, amount, price, reduce=False):
+        try:
+            params = {
+                "reduceOnly": reduce,
+                "holdSide": self.get_hold_side(side, reduce),
+            }
+            return await self._call("create_order", symbol, 'limit', side, amount, price, params=params)
+        except Exception as err:
+            raise Exception(err)
+
+    @authentication_required
+    async def place_limit_stop_loss(self, symbol, side, amount, trigger_price, price, reduce=False):
+        try:
+            params = {
+                'stopPrice': await self.convert_price_to_precision(symbol, trigger_price),
+                "triggerType": "market_price",
+                "reduceOnly": reduce,
+                'stop': True,
+                "holdSide": self.get_hold_side(side, reduce),
+            }
+            return await self._call("create_order", symbol, 'limit', side, amount, price, params=params)
+        except Exception as err:
+            raise Exception(err)
+
+    @authentication_required
+    async def place_market_order(self, symbol, side, amount, reduce=False):
+        try:
+            params = {
+                "reduceOnly": reduce,
+                "holdSide": self.get_hold_side(side, reduce),
+            }
+            return await self._call("create_order", symbol, 'market', side, amount, None, params=params)
+        except Exception as err:
+            raise Exception(err)
+
+    @authentication_required
+    async def place_market_stop_loss(self, symbol, side, amount, trigger_price, reduce=False):
+        try:
+            params = {
+                'stopPrice': await self.convert_price_to_precision(symbol, trigger_price),
+                "triggerType": "market_price",
+                "reduceOnly": reduce,
+                'stop': True,
+                "holdSide": self.get_hold_side(side, reduce),
+            }
+            return await self._call("create_order", symbol, 'market', side, amount, None, params=params)
+        except Exception as err:
+            raise Exception(err)
+
+    @authentication_required
+    async def get_balance_of_one_coin(self, coin):
+        try:
+            balance_info = await self._call("fetch_balance")
+            return balance_info['total'].get(coin, 0.0)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite", err)
+
+    @authentication_required
+    async def get_all_balance(self):
+        try:
+            return await self._call("fetch_balance")
+        except Exception as err:
+            raise Exception("Une erreur s'est produite", err)
+
+    @authentication_required
+    async def get_usdt_equity(self):
+        try:
+            balance_info = await self._call("fetch_balance")
+            return balance_info['total'].get('USDT', 0.0)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans get_usdt_equity", err)
+
+    @authentication_required
+    async def snapshot(self, symbols=None, tickers=None):
+        try:
+            tickers, positions, balance_info = await asyncio.gather(
+                self.get_tickers(symbols) if tickers is None else asyncio.sleep(0, tickers),
+                self.get_open_position(),
+                self._call("fetch_balance"),
+            )
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans snapshot", err)
+        return MarketSnapshot(
+            timestamp=self._session.milliseconds(),
+            usdt_equity=float(balance_info['total'].get('USDT', 0.0)),
+            positions=tuple(positions),
+            tickers=MappingProxyType(tickers),
+            balance=MappingProxyType(balance_info['total']),
+        )
+
+    @authentication_required
+    async def get_open_order(self, symbol, conditional=False):
+        try:
+            params = {'stop': conditional}
+            return await self._call("fetch_open_orders", symbol, params=params)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite", err)
+
+    @authentication_required
+    async def get_my_orders(self, symbol):
+        try:
+            return await self._call("fetch_orders", symbol)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite", err)
+
+    @authentication_required
+    async def get_open_position(self, symbol=None):
+        try:
+            params = {
+                "type": "swap",
+            }
+            positions = await self._call("fetch_positions", symbols=[symbol] if symbol else None, params=params)
+            return [position for position in positions if float(position['contracts']) > 0]
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans get_open_position", err)
+
+    @authentication_required
+    async def cancel_order_by_id(self, id, symbol, conditional=False):
+        try:
+            params = {'stop': conditional} if conditional else {}
+            return await self._call("cancel_order", id, symbol, params=params)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans cancel_order_by_id", err)
+
+    @authentication_required
+    async def cancel_all_open_order(self, symbol=None):
+        try:
+            return await self._call("cancel_all_orders", symbol=symbol)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans cancel_all_open_order", err)
+
+    @authentication_required
+    async def cancel_order_ids(self, ids=[], symbol=None):
+        try:
+            return await self._call("cancel_orders", ids=ids, symbol=symbol)
+        except Exception as err:
+            raise Exception("Une erreur s'est produite dans cancel_order_ids", err)
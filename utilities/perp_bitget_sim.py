@@ -0,0 +1,403 @@
+import json
+import math
+import os
+import ccxt
+import numpy as np
+import pandas as pd
+from types import MappingProxyType
+from utilities.ohlcv_store import OhlcvStore, ohlcv_to_df
+from utilities.market_cache import MarketCache
+from utilities.perp_bitget import PerpBitget, MarketSnapshot
+
+
+class SimulatedPerpBitget():
+    """ Paper trading exchange with the PerpBitget interface
+
+        Orders are filled against the candles of an OhlcvStore at a simulated clock: market orders
+        at the last closed price plus slippage, limit and stop orders when a later candle crosses
+        their price. Positions are kept per side as in bitget's hedge mode, funding is charged on
+        every funding bar crossed by the clock. Nothing is sent to the exchange.
+
+        Args:
+            store_path(str): directory of the OhlcvStore holding the candles,
+            timeframe(str): timeframe of the candles used for prices and fills,
+            initial_balance(float): USDT of a new account,
+            taker_fee(float), maker_fee(float): fees on the notional of market / limit fills,
+            slippage(float): relative price impact of market fills,
+            funding_rate(float): funding per funding_interval hours, paid by longs to shorts,
+            state_path(str): json file keeping balance, positions and orders between runs, None to
+                keep them in memory only,
+            market_cache_path(str): ccxt market table used for amount and price precision, read
+                whatever its age, amounts are left unrounded without it,
+            now(int): simulated time in ms, the current time by default
+    """
+
+    def __init__(self, store_path, timeframe="1h", initial_balance=1000, taker_fee=0.0006, maker_fee=0.0002,
+                 slippage=0.0005, funding_rate=0.0001, funding_interval=8, state_path=None,
+                 market_cache_path=None, now=None):
+        self._store = OhlcvStore(store_path)
+        self.timeframe = timeframe
+        self.timeframe_in_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.slippage = slippage
+        self.funding_rate = funding_rate
+        self.funding_interval_in_ms = funding_interval * 3600 * 1000
+        self.state_path = state_path
+        self._candles = {}
+        self._session = ccxt.bitget()
+        if market_cache_path is not None:
+            cached = MarketCache(market_cache_path, ttl=math.inf).load()
+            if cached is not None:
+                self._session.set_markets(cached["markets"], cached["currencies"])
+
+        self.balance = float(initial_balance)
+        self.positions = {}
+        self.orders = []
+        self.trades = []
+        self._next_id = 1
+        self.now = int(pd.Timestamp.now(tz="UTC").timestamp() * 1000) if now is None else int(now)
+        if state_path is not None and os.path.exists(state_path):
+            self._load_state()
+            if now is not None:
+                self.now = int(now)
+
+    # Etat du compte
+
+    def _load_state(self):
+        with open(self.state_path, "r") as f:
+            state = json.load(f)
+        self.balance = state["balance"]
+        self.positions = {tuple(key.split("|")): position for key, position in state["positions"].items()}
+        self.orders = state["orders"]
+        self.trades = state["trades"]
+        self._next_id = state["next_id"]
+        self.now = state["now"]
+
+    def save(self):
+        """ Write balance, positions, open orders and trades to state_path
+        """
+        if self.state_path is None:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        state = {
+            "balance": self.balance,
+            "positions": {"|".join(key): position for key, position in self.positions.items()},
+            "orders": self.orders,
+            "trades": self.trades,
+            "next_id": self._next_id,
+            "now": self.now,
+        }
+        tmp_file = self.state_path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_path)
+
+    # Horloge et prix
+
+    def _symbol_candles(self, symbol):
+        # Bougies chargées une fois en mémoire par symbole
+        if symbol not in self._candles:
+            self._candles[symbol] = np.array(self._store.load(symbol, self.timeframe))
+        return self._candles[symbol]
+
+    def reload_candles(self):
+        """ Forget the candles read so far, to see rows appended to the store since
+        """
+        self._candles = {}
+
+    def price(self, symbol, timestamp=None):
+        """ Close of the last candle closed at `timestamp` (the simulated clock by default)
+        """
+        candles = self._symbol_candles(symbol)
+        timestamp = self.now if timestamp is None else timestamp
+        last = np.searchsorted(candles[:, 0], timestamp - self.timeframe_in_ms, side="right") - 1
+        if last < 0:
+            raise Exception(f"Aucune bougie pour {symbol} avant {pd.to_datetime(timestamp, unit='ms')}")
+        return float(candles[last, 4])
+
+    def set_time(self, timestamp):
+        """ Move the simulated clock forward, charging funding and filling the limit and stop orders
+            crossed by the candles closed in between
+
+            Args:
+                timestamp(int or pd.Timestamp): new time, in ms when an int
+        """
+        if isinstance(timestamp, pd.Timestamp):
+            timestamp = int(timestamp.timestamp() * 1000)
+        timestamp = int(timestamp)
+        if timestamp <= self.now:
+            return
+        # Découpage aux instants de funding : chaque funding porte sur les positions ouvertes à cet instant
+        interval = self.funding_interval_in_ms
+        for funding_time in range((self.now // interval + 1) * interval, timestamp + 1, interval):
+            self._step(funding_time)
+            self._charge_funding(funding_time)
+        self._step(timestamp)
+
+    def advance(self, candles=1):
+        """ Move the simulated clock forward by a number of candles
+        """
+        self.set_time(self.now + candles * self.timeframe_in_ms)
+
+    def _step(self, timestamp):
+        if self.orders:
+            self._cross_orders(self.now, timestamp)
+        self.now = timestamp
+
+    def _charge_funding(self, funding_time):
+        for (symbol, side), position in self.positions.items():
+            payment = position["contracts"] * self.price(symbol, funding_time) * self.funding_rate
+            self.balance -= payment if side == "long" else -payment
+
+    def _cross_orders(self, start, end):
+        # Bougies clôturées dans (start, end], dans l'ordre, pour chaque symbole ayant des ordres
+        for symbol in {order["symbol"] for order in self.orders}:
+            candles = self._symbol_candles(symbol)
+            first = np.searchsorted(candles[:, 0], start - self.timeframe_in_ms, side="right")
+            last = np.searchsorted(candles[:, 0], end - self.timeframe_in_ms, side="right")
+            for candle in candles[first:last]:
+                for order in [order for order in self.orders if order["symbol"] == symbol]:
+                    self._cross_order(order, candle)
+
+    def _cross_order(self, order, candle):
+        timestamp, high, low = int(candle[0]) + self.timeframe_in_ms, candle[2], candle[3]
+        buy = order["side"] == "buy"
+        if order["stopPrice"] is not None:
+            trigger = order["stopPrice"]
+            if not (high >= trigger if buy else low <= trigger):
+                return
+            if order["type"] == "market":
+                self.orders.remove(order)
+                fill = trigger * (1 + self.slippage if buy else 1 - self.slippage)
+                self._fill(order, fill, self.taker_fee, timestamp)
+                return
+            # Stop limite déclenché : devient un ordre limite ordinaire
+            order["stopPrice"] = None
+        if (low <= order["price"]) if buy else (high >= order["price"]):
+            self.orders.remove(order)
+            self._fill(order, order["price"], self.maker_fee, timestamp)
+
+    # Exécution
+
+    def _new_order(self, symbol, order_type, side, amount, price, reduce, stop_price=None):
+        if side.lower() not in ("buy", "sell"):
+            raise ValueError(f"Invalid side: {side}")
+        order = {
+            "id": str(self._next_id),
+            "symbol": symbol,
+            "type": order_type,
+            "side": side.lower(),
+            "amount": float(amount),
+            "price": None if price is None else float(price),
+            "stopPrice": None if stop_price is None else float(stop_price),
+            "reduceOnly": reduce,
+            "timestamp": self.now,
+            "status": "open",
+            "filled": 0.0,
+            "average": None,
+            "fee": None,
+        }
+        self._next_id += 1
+        return order
+
+    def _fill(self, order, price, fee_rate, timestamp):
+        hold_side = PerpBitget.get_hold_side(self, order["side"], order["reduceOnly"])
+        side = hold_side.replace("close_", "")
+        key = (order["symbol"], side)
+        amount = order["amount"]
+        position = self.positions.get(key)
+        if order["reduceOnly"]:
+            if position is None:
+                order["status"] = "canceled"
+                return order
+            amount = min(amount, position["contracts"])
+            direction = 1 if side == "long" else -1
+            self.balance += direction * amount * (price - position["entryPrice"])
+            position["contracts"] -= amount
+            if position["contracts"] <= 1e-12:
+                del self.positions[key]
+        elif position is None:
+            self.positions[key] = {"contracts": amount, "entryPrice": price, "timestamp": timestamp}
+        else:
+            contracts = position["contracts"] + amount
+            position["entryPrice"] = (position["entryPrice"] * position["contracts"] + price * amount) / contracts
+            position["contracts"] = contracts
+        fee = amount * price * fee_rate
+        self.balance -= fee
+        order.update({
+            "status": "closed",
+            "filled": amount,
+            "average": price,
+            "cost": amount * price,
+            "fee": {"cost": fee, "currency": "USDT"},
+            "lastTradeTimestamp": timestamp,
+        })
+        self.trades.append({
+            "id": order["id"], "symbol": order["symbol"], "side": order["side"], "hold_side": hold_side,
+            "amount": amount, "price": price, "fee": fee, "timestamp": timestamp,
+        })
+        return order
+
+    def get_hold_side(self, side, reduce=False):
+        return PerpBitget.get_hold_side(self, side, reduce)
+
+    def place_market_order(self, symbol, side, amount, reduce=False):
+        order = self._new_order(symbol, "market", side, amount, None, reduce)
+        price = self.price(symbol)
+        fill = price * (1 + self.slippage if order["side"] == "buy" else 1 - self.slippage)
+        return self._fill(order, fill, self.taker_fee, self.now)
+
+    def place_limit_order(self, symbol, side, amount, price, reduce=False):
+        order = self._new_order(symbol, "limit", side, amount, price, reduce)
+        last_price = self.price(symbol)
+        # Ordre limite immédiatement exécutable : rempli comme un ordre au marché au prix courant
+        if (order["side"] == "buy" and order["price"] >= last_price) or (order["side"] == "sell" and order["price"] <= last_price):
+            return self._fill(order, last_price, self.taker_fee, self.now)
+        self.orders.append(order)
+        return order
+
+    def place_limit_stop_loss(self, symbol, side, amount, trigger_price, price, reduce=False):
+        order = self._new_order(symbol, "limit", side, amount, price, reduce, stop_price=trigger_price)
+        self.orders.append(order)
+        return order
+
+    def place_market_stop_loss(self, symbol, side, amount, trigger_price, reduce=False):
+        order = self._new_order(symbol, "market", side, amount, None, reduce, stop_price=trigger_price)
+        self.orders.append(order)
+        return order
+
+    def get_open_order(self, symbol, conditional=False):
+        return [
+            order for order in self.orders
+            if order["symbol"] == symbol and (order["stopPrice"] is not None) == conditional
+        ]
+
+    def get_my_orders(self, symbol):
+        return [order for order in self.orders if order["symbol"] == symbol]
+
+    def cancel_order_by_id(self, id, symbol, conditional=False):
+        for order in self.orders:
+            if order["id"] == str(id) and order["symbol"] == symbol:
+                self.orders.remove(order)
+                order["status"] = "canceled"
+                return order
+        raise Exception("Une erreur s'est produite dans cancel_order_by_id", f"Ordre {id} introuvable")
+
+    def cancel_all_open_order(self, symbol=None):
+        canceled = [order for order in self.orders if symbol is None or order["symbol"] == symbol]
+        for order in canceled:
+            self.orders.remove(order)
+            order["status"] = "canceled"
+        return canceled
+
+    def cancel_order_ids(self, ids=[], symbol=None):
+        return [self.cancel_order_by_id(id, symbol) for id in ids]
+
+    # Compte
+
+    def get_open_position(self, symbol=None):
+        positions = []
+        for (position_symbol, side), position in self.positions.items():
+            if symbol is not None and position_symbol != symbol:
+                continue
+            mark_price = self.price(position_symbol)
+            direction = 1 if side == "long" else -1
+            positions.append({
+                "symbol": position_symbol,
+                "side": side,
+                "contracts": position["contracts"],
+                "contractSize": 1.0,
+                "entryPrice": position["entryPrice"],
+                "markPrice": mark_price,
+                "notional": position["contracts"] * mark_price,
+                "unrealizedPnl": direction * position["contracts"] * (mark_price - position["entryPrice"]),
+                "timestamp": position["timestamp"],
+            })
+        return positions
+
+    def get_usdt_equity(self):
+        return self.balance + sum(position["unrealizedPnl"] for position in self.get_open_position())
+
+    def get_balance_of_one_coin(self, coin):
+        return self.get_usdt_equity() if coin == "USDT" else 0.0
+
+    def get_all_balance(self):
+        equity = self.get_usdt_equity()
+        used = sum(position["notional"] for position in self.get_open_position())
+        return {
+            "total": {"USDT": equity},
+            "free": {"USDT": equity - used},
+            "used": {"USDT": used},
+        }
+
+    def snapshot(self, symbols=None, tickers=None):
+        # Prix toujours lus à l'horloge simulée, les tickers fournis (marché réel) sont ignorés
+        positions = self.get_open_position()
+        if symbols is None:
+            symbols = sorted({position["symbol"] for position in positions})
+        tickers = {}
+        for symbol in symbols:
+            price = self.price(symbol)
+            tickers[symbol] = {
+                "symbol": symbol,
+                "timestamp": self.now,
+                "last": price,
+                "bid": price * (1 - self.slippage),
+                "ask": price * (1 + self.slippage),
+            }
+        equity = self.balance + sum(position["unrealizedPnl"] for position in positions)
+        return MarketSnapshot(
+            timestamp=self.now,
+            usdt_equity=equity,
+            positions=tuple(positions),
+            tickers=MappingProxyType(tickers),
+            balance=MappingProxyType({"USDT": equity}),
+        )
+
+    # Données de marché
+
+    @property
+    def market(self):
+        return self._session.markets or {}
+
+    def get_bid_ask_price(self, symbol):
+        price = self.price(symbol)
+        return {"bid": price * (1 - self.slippage), "ask": price * (1 + self.slippage)}
+
+    def get_min_order_amount(self, symbol):
+        if symbol not in self.market:
+            return 0.0
+        return self._session.market(symbol)["limits"]["amount"]["min"]
+
+    def convert_amount_to_precision(self, symbol, amount):
+        if symbol not in self.market:
+            return str(amount)
+        return self._session.amount_to_precision(symbol, amount)
+
+    def convert_price_to_precision(self, symbol, price):
+        if symbol not in self.market:
+            return str(price)
+        return self._session.price_to_precision(symbol, price)
+
+    def get_more_last_historical(self, symbol, timeframe, limit):
+        # Bougies jusqu'à l'horloge, la bougie en cours réduite à son ouverture (pas de données futures)
+        if timeframe == self.timeframe:
+            candles = self._symbol_candles(symbol)
+        else:
+            candles = np.array(self._store.load(symbol, timeframe))
+        last = np.searchsorted(candles[:, 0], self.now, side="right")
+        data = candles[max(last - limit, 0):last].copy()
+        timeframe_in_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        if len(data) > 0 and data[-1, 0] + timeframe_in_ms > self.now:
+            data[-1, 2:5] = data[-1, 1]
+            data[-1, 5] = 0.0
+        return ohlcv_to_df(data)
+
+    def get_last_historical(self, symbol, timeframe, limit):
+        return self.get_more_last_historical(symbol, timeframe, limit)
+
+    def get_stored_historical(self, symbol, timeframe, limit):
+        return self.get_more_last_historical(symbol, timeframe, limit)
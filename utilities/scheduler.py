@@ -0,0 +1,114 @@
+import ast
+import importlib.util
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import traceback
+from datetime import datetime
+import ccxt
+
+
+def next_bar_close(now, timeframe_in_seconds):
+    """ Close time (in seconds) of the candle running at `now`, candles being aligned on the epoch
+    """
+    return (now // timeframe_in_seconds + 1) * timeframe_in_seconds
+
+
+def load_strategy(path):
+    """ Callables running one execution of a strategy script
+
+        A script defining a module level run() is imported once, its clients and state then stay in
+        memory between executions, and its close() (if any) is called at shutdown. Other scripts,
+        whose code runs at import, are started as a subprocess at every execution.
+
+        Returns:
+            tuple: (run, close), close is None when there is nothing to close
+    """
+    with open(path, "r") as f:
+        tree = ast.parse(f.read(), path)
+    functions = {node.name for node in tree.body if isinstance(node, ast.FunctionDef)}
+    if "run" not in functions:
+        return (lambda: subprocess.run([sys.executable, path], check=False)), None
+
+    # Le dossier du script est importable comme lorsqu'il est lancé directement (fichiers de config)
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.run, getattr(module, "close", None)
+
+
+class Scheduler():
+    """ Long running process executing the registered strategies after every candle close
+
+        The process wakes `delay` seconds after each close plus a random jitter bounded by `jitter`
+        seconds, then runs the strategies one after the other. An execution still running at the
+        next close delays it, the missed candle is not replayed. SIGTERM / SIGINT stop the loop
+        between two executions and close the strategies.
+
+        Args:
+            timeframe(str): candle period, as in ccxt ("1h", "15m"...),
+            delay(float): seconds waited after the candle close, for the exchange to publish it,
+            jitter(float): maximum random extra wait in seconds, spreading the load on the exchange
+    """
+
+    def __init__(self, timeframe="1h", delay=5, jitter=30):
+        self.timeframe_in_seconds = ccxt.Exchange.parse_timeframe(timeframe)
+        self.delay = delay
+        self.jitter = jitter
+        self.strategies = []
+        self._stop = False
+
+    def register(self, name, run, close=None):
+        self.strategies.append((name, run, close))
+
+    def stop(self, *args):
+        self._stop = True
+
+    def next_run_time(self, now=None):
+        now = time.time() if now is None else now
+        return next_bar_close(now, self.timeframe_in_seconds) + self.delay + random.uniform(0, self.jitter)
+
+    def _sleep_until(self, wake):
+        # Attente par tranches courtes pour réagir vite à un arrêt
+        while not self._stop:
+            remaining = wake - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 1))
+
+    def run_once(self):
+        for name, run, _ in self.strategies:
+            start = time.perf_counter()
+            try:
+                run()
+            except Exception:
+                print(f"Erreur dans la stratégie {name} :")
+                traceback.print_exc()
+            print(f"--- {name} exécutée en {time.perf_counter() - start:.2f}s ---")
+            sys.stdout.flush()
+
+    def run_forever(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        try:
+            while not self._stop:
+                wake = self.next_run_time()
+                print(f"Prochaine exécution : {datetime.fromtimestamp(wake).strftime('%d/%m/%Y %H:%M:%S')}")
+                sys.stdout.flush()
+                self._sleep_until(wake)
+                if not self._stop:
+                    self.run_once()
+        finally:
+            for name, _, close in self.strategies:
+                if close is not None:
+                    try:
+                        close()
+                    except Exception as err:
+                        print(f"Erreur à la fermeture de {name} : {err}")
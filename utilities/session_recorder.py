@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import deque
+import ccxt
+
+
+def _call_key(method, args, kwargs):
+    return method + json.dumps([args, kwargs], sort_keys=True, default=str)
+
+
+class ReplayMissError(KeyError):
+    """ Call absent from the recording (or requested more times than it was recorded)
+    """
+
+
+class SessionRecorder():
+    """ Proxy of a ccxt exchange appending every public method call to a JSON lines file
+
+        Each call is written as {"call", "args", "kwargs", "response", "latency", "async"} (or
+        "error" instead of "response"). Responses are stored once per distinct content in "blob"
+        lines and referenced by digest, so the market table or repeated tickers do not bloat the
+        file. Attributes are read and written through to the wrapped session.
+
+        Args:
+            session(ccxt.Exchange): sync or async ccxt exchange,
+            path(str): file the calls are appended to
+    """
+
+    def __init__(self, session, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        object.__setattr__(self, "_recorder_session", session)
+        object.__setattr__(self, "_recorder_file", open(path, "a"))
+        object.__setattr__(self, "_recorder_blobs", set())
+
+    def __getattr__(self, name):
+        attribute = getattr(self._recorder_session, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception as err:
+                self._record(name, args, kwargs, start, error=err)
+                raise
+            if inspect.isawaitable(result):
+                return self._record_async(name, args, kwargs, start, result)
+            self._record(name, args, kwargs, start, response=result)
+            return result
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._recorder_session, name, value)
+
+    async def _record_async(self, name, args, kwargs, start, awaitable):
+        try:
+            response = await awaitable
+        except Exception as err:
+            self._record(name, args, kwargs, start, error=err, asynchronous=True)
+            raise
+        self._record(name, args, kwargs, start, response=response, asynchronous=True)
+        return response
+
+    def _record(self, name, args, kwargs, start, response=None, error=None, asynchronous=False):
+        line = {
+            "call": name,
+            "args": args,
+            "kwargs": kwargs,
+            "latency": time.perf_counter() - start,
+            "async": asynchronous,
+        }
+        if error is not None:
+            line["error"] = [type(error).__name__, str(error)]
+        else:
+            data = json.dumps(response, sort_keys=True, default=str)
+            digest = hashlib.sha1(data.encode()).hexdigest()
+            if digest not in self._recorder_blobs:
+                self._recorder_file.write(f'{{"blob": "{digest}", "data": {data}}}\n')
+                self._recorder_blobs.add(digest)
+            line["response"] = digest
+        self._recorder_file.write(json.dumps(line, default=str) + "\n")
+        self._recorder_file.flush()
+
+    def close_recording(self):
+        self._recorder_file.close()
+
+
+class ReplaySession():
+    """ Stand-in for a ccxt exchange serving the responses of a SessionRecorder file, without network
+
+        Calls are matched on method and arguments. Identical calls get their recorded responses in
+        the recorded order, recorded errors are raised again with their ccxt exception type.
+        A run replays deterministically with the same local files (OHLCV store, market cache) as
+        the recorded run, since they decide which calls are made.
+
+        Args:
+            path(str): file written by SessionRecorder,
+            latency_scale(float): recorded latency multiplier waited before every response,
+                0 to answer immediately
+    """
+
+    def __init__(self, path, latency_scale=0):
+        self.latency_scale = latency_scale
+        self.markets = None
+        self.market_cache = None
+        self.calls = 0
+        self._queues = {}
+        blobs = {}
+        with open(path, "r") as f:
+            for row in f:
+                line = json.loads(row)
+                if "blob" in line:
+                    blobs[line["blob"]] = line["data"]
+                    continue
+                if "response" in line:
+                    line["response"] = blobs[line["response"]]
+                key = _call_key(line["call"], line["args"], line["kwargs"])
+                self._queues.setdefault(key, deque()).append(line)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            key = _call_key(name, json.loads(json.dumps(list(args), default=str)),
+                            json.loads(json.dumps(kwargs, default=str)))
+            queue = self._queues.get(key)
+            if not queue:
+                raise ReplayMissError(f"Appel non enregistré : {name}{args} {kwargs}")
+            line = queue.popleft()
+            self.calls += 1
+            if line["async"]:
+                return self._serve_async(name, line)
+            if self.latency_scale:
+                time.sleep(line["latency"] * self.latency_scale)
+            return self._serve(name, line)
+        return call
+
+    async def _serve_async(self, name, line):
+        if self.latency_scale:
+            await asyncio.sleep(line["latency"] * self.latency_scale)
+        return self._serve(name, line)
+
+    def _serve(self, name, line):
+        if "error" in line:
+            error_type, message = line["error"]
+            error_class = getattr(ccxt, error_type, None)
+            if not (isinstance(error_class, type) and issubclass(error_class, Exception)):
+                error_class = Exception
+            raise error_class(message)
+        if name == "load_markets":
+            self.markets = line["response"]
+        return line["response"]
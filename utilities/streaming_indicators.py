@@ -0,0 +1,422 @@
+import json
+import math
+import os
+from collections import deque
+import numpy as np
+
+_INDICATORS = {}
+
+
+def _div(a, b):
+    # Division with numpy semantics (inf / nan instead of ZeroDivisionError), like pandas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(a) / np.float64(b))
+
+
+def _is_nan(value):
+    return value != value
+
+
+class StreamingIndicator():
+    """ Base class of the O(1)-per-bar indicators
+
+        Every indicator exposes update(...) which advances its state by one bar and returns
+        the new value(s), with the same warm-up NaNs as the batch ta/custom_indicators version.
+        to_dict()/from_dict() turn the state into json-compatible data so it can be saved
+        between runs with save_states/load_states.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _INDICATORS[cls.__name__] = cls
+
+    def to_dict(self):
+        return {"type": type(self).__name__, "state": {key: _dump(value) for key, value in self.__dict__.items()}}
+
+    @staticmethod
+    def from_dict(data):
+        indicator = _INDICATORS[data["type"]].__new__(_INDICATORS[data["type"]])
+        for key, value in data["state"].items():
+            setattr(indicator, key, _load(value))
+        return indicator
+
+
+def _dump(value):
+    if isinstance(value, StreamingIndicator):
+        return {"indicator": value.to_dict()}
+    if isinstance(value, deque):
+        return {"deque": [_dump(item) for item in value], "maxlen": value.maxlen}
+    if isinstance(value, (list, tuple)):
+        return [_dump(item) for item in value]
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict) and "indicator" in value:
+        return StreamingIndicator.from_dict(value["indicator"])
+    if isinstance(value, dict) and "deque" in value:
+        return deque([_load(item) for item in value["deque"]], maxlen=value["maxlen"])
+    if isinstance(value, list):
+        return [_load(item) for item in value]
+    return value
+
+
+def save_states(path, states, last_timestamp=None):
+    """ Save a dict of indicators (name -> StreamingIndicator) and the timestamp of the last bar fed
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {
+        "last_timestamp": last_timestamp,
+        "states": {name: indicator.to_dict() for name, indicator in states.items()},
+    }
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w") as f:
+        f.write(json.dumps(data))
+    os.replace(tmp_file, path)
+
+
+def load_states(path):
+    """ Returns:
+            tuple: (dict of indicators, last_timestamp), ({}, None) if there is no saved state
+    """
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}, None
+    states = {name: StreamingIndicator.from_dict(state) for name, state in data["states"].items()}
+    return states, data["last_timestamp"]
+
+
+class StreamingEma(StreamingIndicator):
+    """ Exponential moving average, same recursion as pandas ewm(adjust=False)
+
+        Args:
+            window(int): span of the EMA (alpha = 2 / (window + 1)), as ta.trend.ema_indicator,
+            alpha(float): smoothing factor, used instead of window when given,
+            min_periods(int): observations needed before a value is returned (default: window)
+    """
+
+    def __init__(self, window=None, alpha=None, min_periods=None):
+        # alpha derived through the center of mass, exactly as pandas does
+        com = (window - 1) / 2 if alpha is None else 1 / alpha - 1
+        self.alpha = 1. / (1. + com)
+        self.min_periods = max(min_periods if min_periods is not None else (window or 0), 1)
+        self.weighted = math.nan
+        self.old_wt = 1.
+        self.nobs = 0
+
+    def update(self, value):
+        value = float(value)
+        is_observation = not _is_nan(value)
+        self.nobs += is_observation
+        if not _is_nan(self.weighted):
+            # missing values still decay the previous average (ignore_na=False)
+            self.old_wt *= 1. - self.alpha
+            if is_observation:
+                if self.weighted != value:
+                    self.weighted = (self.old_wt * self.weighted + self.alpha * value) / (self.old_wt + self.alpha)
+                self.old_wt = 1.
+        elif is_observation:
+            self.weighted = value
+        return self.weighted if self.nobs >= self.min_periods else math.nan
+
+
+class StreamingRma(StreamingEma):
+    """ Wilder's moving average, as custom_indicators.rma
+    """
+
+    def __init__(self, period):
+        super().__init__(alpha=1 / period, min_periods=0)
+
+
+class _RollingWindow(StreamingIndicator):
+    """ Keeps the last `window` values, a value is returned once the window holds `window` non-NaN values
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.n_valid = 0
+
+    def _push(self, value):
+        if len(self.values) == self.window and not _is_nan(self.values[0]):
+            self.n_valid -= 1
+        self.values.append(value)
+        if not _is_nan(value):
+            self.n_valid += 1
+
+    def ready(self):
+        return self.n_valid >= self.window
+
+
+class StreamingRollingSum(_RollingWindow):
+    """ Rolling sum with a running total, resynchronised every `window` bars to avoid drift
+    """
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.total = 0.0
+        self.since_resync = 0
+
+    def update(self, value):
+        value = float(value)
+        if len(self.values) == self.window and not _is_nan(self.values[0]):
+            self.total -= self.values[0]
+        self._push(value)
+        if not _is_nan(value):
+            self.total += value
+        self.since_resync += 1
+        if self.since_resync >= self.window:
+            self.total = math.fsum(v for v in self.values if not _is_nan(v))
+            self.since_resync = 0
+        return self.total if self.ready() else math.nan
+
+
+class StreamingSma(StreamingRollingSum):
+    """ Simple moving average, as ta.trend.sma_indicator
+    """
+
+    def update(self, value):
+        total = super().update(value)
+        return total / self.window if self.ready() else math.nan
+
+
+class StreamingBollinger(_RollingWindow):
+    """ Bollinger bands, as ta.volatility.BollingerBands (population std)
+
+        Running sums of (value - shift) and its square keep the variance accurate on high
+        prices; every `window` bars they are recomputed from the window, re-centred on its mean.
+
+        Returns:
+            tuple: (mavg, hband, lband)
+    """
+
+    def __init__(self, window=20, window_dev=2):
+        super().__init__(window)
+        self.window_dev = window_dev
+        self.shift = 0.0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.since_resync = 0
+
+    def update(self, value):
+        value = float(value)
+        if len(self.values) == self.window and not _is_nan(self.values[0]):
+            expiring = self.values[0] - self.shift
+            self.total -= expiring
+            self.total_sq -= expiring * expiring
+        if self.n_valid == 0 and not _is_nan(value):
+            self.shift = value
+        self._push(value)
+        if not _is_nan(value):
+            centered = value - self.shift
+            self.total += centered
+            self.total_sq += centered * centered
+        self.since_resync += 1
+        if self.since_resync >= self.window:
+            self._resync()
+        if not self.ready():
+            return math.nan, math.nan, math.nan
+        mean = self.total / self.window
+        std = math.sqrt(max(self.total_sq / self.window - mean * mean, 0.0))
+        mavg = mean + self.shift
+        return mavg, mavg + self.window_dev * std, mavg - self.window_dev * std
+
+    def _resync(self):
+        valid = [v for v in self.values if not _is_nan(v)]
+        self.shift = math.fsum(valid) / len(valid) if valid else 0.0
+        self.total = math.fsum(v - self.shift for v in valid)
+        self.total_sq = math.fsum((v - self.shift) ** 2 for v in valid)
+        self.since_resync = 0
+
+
+class _RollingExtremum(_RollingWindow):
+    """ Rolling max (or min) with a monotonic deque of (bar index, value)
+    """
+    sign = 1
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.count = 0
+        self.candidates = deque()
+
+    def update(self, value):
+        value = float(value)
+        self._push(value)
+        if not _is_nan(value):
+            while self.candidates and self.sign * self.candidates[-1][1] <= self.sign * value:
+                self.candidates.pop()
+            self.candidates.append([self.count, value])
+        while self.candidates and self.candidates[0][0] <= self.count - self.window:
+            self.candidates.popleft()
+        self.count += 1
+        return self.candidates[0][1] if self.ready() else math.nan
+
+
+class StreamingRollingMax(_RollingExtremum):
+    sign = 1
+
+
+class StreamingRollingMin(_RollingExtremum):
+    sign = -1
+
+
+class StreamingBollingerTrend(StreamingIndicator):
+    """ Indicators of the bol_trend strategy (Bollinger bands, long SMA and their previous values)
+
+        Returns:
+            dict: lower_band, higher_band, ma_band, long_ma, n1_close, n1_lower_band, n1_higher_band
+    """
+
+    def __init__(self, bb_window, bb_std, long_ma_window):
+        self.bollinger = StreamingBollinger(bb_window, bb_std)
+        self.long_ma = StreamingSma(long_ma_window)
+        self.previous = [math.nan, math.nan, math.nan]
+        # Valeurs de la dernière bougie fournie, relues quand aucune bougie n'a clôturé depuis
+        self.row = None
+
+    def update(self, close):
+        close = float(close)
+        ma_band, higher_band, lower_band = self.bollinger.update(close)
+        row = {
+            "lower_band": lower_band,
+            "higher_band": higher_band,
+            "ma_band": ma_band,
+            "long_ma": self.long_ma.update(close),
+            "n1_close": self.previous[0],
+            "n1_lower_band": self.previous[1],
+            "n1_higher_band": self.previous[2],
+        }
+        self.previous = [close, lower_band, higher_band]
+        self.row = row
+        return row
+
+
+class StreamingTrix(StreamingIndicator):
+    """ Streaming version of custom_indicators.Trix
+
+        Returns:
+            dict: trix_line, trix_pct_line, trix_signal_line, trix_histo
+    """
+
+    def __init__(self, trix_length=9, trix_signal_length=21, trix_signal_type="sma"):
+        self.ema = [StreamingEma(trix_length) for _ in range(3)]
+        if trix_signal_type == "sma":
+            self.signal = StreamingSma(trix_signal_length)
+        elif trix_signal_type == "ema":
+            self.signal = StreamingEma(trix_signal_length)
+        self.previous_line = math.nan
+
+    def update(self, close):
+        trix_line = float(close)
+        for ema in self.ema:
+            trix_line = ema.update(trix_line)
+        trix_pct_line = (_div(trix_line, self.previous_line) - 1) * 100
+        if not _is_nan(trix_line):
+            self.previous_line = trix_line
+        trix_signal_line = self.signal.update(trix_pct_line)
+        return {
+            "trix_line": trix_line,
+            "trix_pct_line": trix_pct_line,
+            "trix_signal_line": trix_signal_line,
+            "trix_histo": trix_pct_line - trix_signal_line,
+        }
+
+
+class StreamingVmc(StreamingIndicator):
+    """ Streaming version of custom_indicators.VMC
+
+        Returns:
+            dict: wave_1, wave_2, money_flow
+    """
+
+    def __init__(self, wtChannelLen=9, wtAverageLen=12, wtMALen=3, rsiMFIperiod=60, rsiMFIMultiplier=150, rsiMFIPosY=2.5):
+        self.esa = StreamingEma(wtChannelLen)
+        self.de = StreamingEma(wtChannelLen)
+        self.wt1 = StreamingEma(wtAverageLen)
+        self.wt2 = StreamingSma(wtMALen)
+        self.mfi = StreamingSma(rsiMFIperiod)
+        self.rsiMFIMultiplier = rsiMFIMultiplier
+        self.rsiMFIPosY = rsiMFIPosY
+
+    def update(self, open, high, low, close):
+        hlc3 = float(close) + float(high) + float(low)
+        esa = self.esa.update(hlc3)
+        de = self.de.update(abs(hlc3 - esa))
+        wave_1 = self.wt1.update(_div(hlc3 - esa, 0.015 * de))
+        mfi = _div(float(close) - float(open), float(high) - float(low)) * self.rsiMFIMultiplier
+        return {
+            "wave_1": wave_1,
+            "wave_2": self.wt2.update(wave_1),
+            "money_flow": self.mfi.update(mfi) - self.rsiMFIPosY,
+        }
+
+
+class StreamingChop(StreamingIndicator):
+    """ Streaming version of custom_indicators.chop
+    """
+
+    def __init__(self, window=14):
+        self.window = window
+        self.atr_sum = StreamingRollingSum(window)
+        self.highh = StreamingRollingMax(window)
+        self.lowl = StreamingRollingMin(window)
+        self.previous_close = math.nan
+
+    def update(self, high, low, close):
+        high, low, close = float(high), float(low), float(close)
+        highh = self.highh.update(high)
+        lowl = self.lowl.update(low)
+        ranges = (high - low, abs(high - self.previous_close), abs(low - self.previous_close))
+        self.previous_close = close
+        # bars without true range are dropped from the atr window, as in the batch version
+        if any(_is_nan(v) for v in ranges):
+            return math.nan
+        atr_sum = self.atr_sum.update(max(ranges))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return float(100 * np.log10(_div(atr_sum, highh - lowl)) / np.log10(self.window))
+
+
+class StreamingMaSlope(StreamingIndicator):
+    """ Streaming version of custom_indicators.MaSlope
+
+        Returns:
+            tuple: (ma, xangle)
+    """
+
+    def __init__(self, long_ma=200, major_length=14, minor_length=6, slope_period=34, slope_ir=25):
+        self.min_alpha = 2 / (minor_length + 1)
+        self.maj_alpha = 2 / (major_length + 1)
+        self.slope_ir = slope_ir
+        self.hh = StreamingRollingMax(long_ma + 1)
+        self.ll = StreamingRollingMin(long_ma + 1)
+        self.hh1 = StreamingRollingMax(slope_period)
+        self.ll1 = StreamingRollingMin(slope_period)
+        self.ma = 0.0
+        self.previous_ma = [math.nan, math.nan]
+
+    def update(self, close, high, low):
+        hh = _fill_zero(self.hh.update(high))
+        ll = _fill_zero(self.ll.update(low))
+        close, high, low = _fill_zero(float(close)), _fill_zero(float(high)), _fill_zero(float(low))
+        mult = 0.0 if hh == ll else abs(2 * close - ll - hh) / (hh - ll)
+        final = mult * (self.min_alpha - self.maj_alpha) + self.maj_alpha
+        ma = self.ma + final ** 2 * (close - self.ma)
+        n2_ma = self.previous_ma[0]
+        self.previous_ma = [self.previous_ma[1], ma]
+        self.ma = ma
+        hh1 = self.hh1.update(high)
+        ll1 = self.ll1.update(low)
+        slope_range = _div(self.slope_ir, hh1 - ll1) * ll1
+        dt = _div(n2_ma - ma, close) * slope_range
+        c = (1 + dt * dt) ** 0.5
+        with np.errstate(invalid='ignore'):
+            xangle = float(np.round(180 * np.arccos(_div(1, c)) / (math.atan(1) * 4)))
+        return ma, -xangle if dt > 0 else xangle
+
+
+def _fill_zero(value):
+    return 0.0 if _is_nan(value) else value
@@ -0,0 +1,282 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from utilities.panel import rolling_mean, rolling_mean_std, lag
+
+SWEEP_METRICS = ["total_return", "max_drawdown", "sharpe", "trades", "win_rate"]
+
+# Panel de clôtures partagé avec les workers, attaché une fois par processus
+_shared = {}
+
+
+def _attach_panel(name, shape, funding_bars):
+    block = shared_memory.SharedMemory(name=name)
+    _shared["block"] = block
+    _shared["close"] = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+    _shared["funding_bars"] = funding_bars
+
+
+def _sweep_worker(column, grid, options):
+    close = _shared["close"][:, column]
+    return sweep_symbol(close, _shared["funding_bars"], *grid, **options)
+
+
+def sweep_symbol(close, funding_bars, bb_windows, bb_stds, long_ma_windows, ranges=None, exposure=1,
+                 leverage=2, types=("long", "short"), fee_rate=0.0006, funding_rate=0.0001,
+                 bars_per_year=365 * 24):
+    """ Bollinger trend backtest of one symbol over a whole parameter grid
+
+        Every combination is replayed at once, bar by bar, with the rules and accounting of
+        run_backtest (exits then entries at the close, fees on every fill, funding on funding bars,
+        each entry sized at exposure * leverage of the equity). The rolling mean/std of a bb_window
+        is computed once and shared by every bb_std, the long MA once per long_ma_window.
+
+        Args:
+            close(np.array): closes of the symbol on the panel index, NaN where it has no candle,
+            funding_bars(np.array): booleans, True on the bars where funding is paid,
+            bb_windows, bb_stds, long_ma_windows(list): values of the grid,
+            ranges(list): (start, end) bar positions replayed separately, each starting flat, on the
+                indicators of the whole history, None for the whole history,
+            exposure(float): fraction of equity per position before leverage,
+            bars_per_year(float): annualisation of the sharpe ratio
+
+        Returns:
+            dict: metric name (SWEEP_METRICS) -> array of shape (len(bb_windows), len(bb_stds), len(long_ma_windows)),
+                a list of such dicts, one per range, when ranges is given
+    """
+    close = np.asarray(close, dtype=np.float64)
+    bb_stds = np.asarray(bb_stds, dtype=np.float64)
+    n_bars = len(close)
+    shape = (len(bb_windows), len(bb_stds), len(long_ma_windows))
+
+    # Statistiques glissantes calculées une fois par fenêtre, bandes dérivées pour chaque bb_std
+    ma_band = np.empty((n_bars, len(bb_windows)))
+    std = np.empty((n_bars, len(bb_windows)))
+    for i, window in enumerate(bb_windows):
+        ma_band[:, i], std[:, i] = (stat[:, 0] for stat in rolling_mean_std(close[:, None], window))
+    long_ma = np.empty((n_bars, len(long_ma_windows)))
+    for i, window in enumerate(long_ma_windows):
+        long_ma[:, i] = rolling_mean(close[:, None], window)[:, 0]
+
+    values = close[:, None, None]
+    n1_close = lag(close[:, None])[:, :, None]
+    with np.errstate(invalid="ignore"):
+        higher_band = ma_band[:, :, None] + bb_stds * std[:, :, None]
+        lower_band = ma_band[:, :, None] - bb_stds * std[:, :, None]
+        # Conditions de bandes (temps x bb_window x bb_std) et de tendance (temps x long_ma_window)
+        long_band = (n1_close < lag(higher_band)) & (values > higher_band) & ("long" in types)
+        short_band = (n1_close > lag(lower_band)) & (values < lower_band) & ("short" in types)
+        above_ma = close[:, None] > long_ma
+        below_ma = close[:, None] < long_ma
+        close_long = close[:, None] < ma_band
+        close_short = close[:, None] > ma_band
+    del higher_band, lower_band
+    entry_bars = long_band.any(axis=(1, 2)) | short_band.any(axis=(1, 2))
+    prices = np.nan_to_num(pd.Series(close).ffill().to_numpy())
+
+    replay = {
+        "prices": prices, "funding_bars": funding_bars, "entry_bars": entry_bars,
+        "long_band": long_band, "short_band": short_band, "above_ma": above_ma, "below_ma": below_ma,
+        "close_long": close_long, "close_short": close_short,
+    }
+    options = {
+        "sizing": exposure * leverage, "fee_rate": fee_rate, "funding_rate": funding_rate,
+        "bars_per_year": bars_per_year,
+    }
+    if ranges is None:
+        return _replay_grid(shape, 0, n_bars, **replay, **options)
+    return [_replay_grid(shape, start, end, **replay, **options) for start, end in ranges]
+
+
+def _replay_grid(shape, start, end, prices, funding_bars, entry_bars, long_band, short_band, above_ma, below_ma,
+                 close_long, close_short, sizing, fee_rate, funding_rate, bars_per_year):
+    # Rejoue toutes les combinaisons sur les bougies [start, end), en partant sans position
+    balance = np.ones(shape)
+    quantity = np.zeros(shape)
+    entry_price = np.zeros(shape)
+    position_costs = np.zeros(shape)
+    previous_equity = np.ones(shape)
+    peak = np.ones(shape)
+    max_drawdown = np.zeros(shape)
+    return_sum = np.zeros(shape)
+    return_square = np.zeros(shape)
+    trades = np.zeros(shape, dtype=np.int64)
+    wins = np.zeros(shape, dtype=np.int64)
+
+    for t in range(start, end):
+        price = prices[t]
+        if funding_bars[t]:
+            payment = quantity * (price * funding_rate)
+            balance -= payment
+            position_costs += payment
+
+        # Fermeture des positions
+        exits = (quantity > 0) & close_long[t][:, None, None] | (quantity < 0) & close_short[t][:, None, None]
+        if exits.any():
+            fee = np.abs(quantity) * (price * fee_rate)
+            gross_pnl = quantity * (price - entry_price)
+            balance += np.where(exits, gross_pnl - fee, 0.0)
+            trades += exits
+            wins += exits & (gross_pnl - fee - position_costs > 0)
+            quantity[exits] = 0.0
+
+        # Ouverture de nouvelles positions, la seule position de la combinaison étant fermée
+        if entry_bars[t]:
+            free = quantity == 0
+            wants_long = free & long_band[t][:, :, None] & above_ma[t]
+            wants_short = free & ~wants_long & short_band[t][:, :, None] & below_ma[t]
+            entries = wants_long | wants_short
+            if entries.any():
+                size = balance * sizing / price
+                fee = size * (price * fee_rate)
+                balance -= np.where(entries, fee, 0.0)
+                quantity = np.where(wants_long, size, np.where(wants_short, -size, quantity))
+                entry_price = np.where(entries, price, entry_price)
+                position_costs = np.where(entries, fee, position_costs)
+
+        equity = balance + quantity * (price - entry_price)
+        bar_return = equity / previous_equity - 1
+        return_sum += bar_return
+        return_square += bar_return * bar_return
+        np.maximum(peak, equity, out=peak)
+        np.minimum(max_drawdown, equity / peak - 1, out=max_drawdown)
+        previous_equity = equity
+
+    n_bars = max(end - start, 1)
+    mean = return_sum / n_bars
+    volatility = np.sqrt(np.maximum(return_square / n_bars - mean * mean, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(volatility > 0, mean / volatility * np.sqrt(bars_per_year), np.nan)
+        win_rate = np.where(trades > 0, wins / trades, np.nan)
+    return {
+        "total_return": previous_equity - 1,
+        "max_drawdown": max_drawdown,
+        "sharpe": sharpe,
+        "trades": trades,
+        "win_rate": win_rate,
+    }
+
+
+def run_sweep(close, bb_windows, bb_stds, long_ma_windows, ranges=None, workers=None, funding_interval=8,
+              **kwargs):
+    """ Parameter sweep of the Bollinger trend strategy, one task per symbol over a process pool
+
+        The close panel is copied once into shared memory and attached by every worker instead of
+        being pickled with each task.
+
+        Args:
+            close(pd.DataFrame): time x symbol close panel,
+            bb_windows, bb_stds, long_ma_windows(list): values of the grid,
+            ranges(list): (start, end) bar positions evaluated separately (folds), each on the
+                indicators of the whole history, None for the whole history,
+            workers(int): number of processes, os.cpu_count() by default,
+            funding_interval(int): hours between fundings,
+            kwargs: exposure (a float, or a dict symbol -> float), leverage, types, fee_rate,
+                funding_rate (a float) passed to sweep_symbol
+
+        Returns:
+            pd.DataFrame: one row per symbol and combination, parameters then SWEEP_METRICS, preceded
+                by the position of the range in a "fold" column when ranges is given
+    """
+    symbols = list(close.columns)
+    values = close.to_numpy(dtype=np.float64)
+    index = close.index
+    if isinstance(kwargs.get("funding_rate"), pd.DataFrame):
+        raise ValueError("run_sweep only takes a scalar funding_rate")
+    exposure = kwargs.pop("exposure", 1)
+    if not isinstance(exposure, dict):
+        exposure = dict.fromkeys(symbols, exposure)
+    funding_bars = (index.hour % funding_interval == 0) & (index.minute == 0)
+    if "bars_per_year" not in kwargs and len(index) > 1:
+        kwargs["bars_per_year"] = pd.Timedelta(days=365) / (index[-1] - index[0]) * (len(index) - 1)
+    grid = (list(bb_windows), list(bb_stds), list(long_ma_windows))
+
+    block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    try:
+        np.ndarray(values.shape, dtype=np.float64, buffer=block.buf)[:] = values
+        with ProcessPoolExecutor(
+            max_workers=min(workers or os.cpu_count(), max(len(symbols), 1)),
+            initializer=_attach_panel,
+            initargs=(block.name, values.shape, funding_bars),
+        ) as executor:
+            options = dict(kwargs, ranges=None if ranges is None else list(ranges))
+            futures = [
+                executor.submit(_sweep_worker, column, grid, dict(options, exposure=exposure[symbol]))
+                for column, symbol in enumerate(symbols)
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        block.close()
+        block.unlink()
+
+    # Table compacte : types numériques réduits, symbole catégoriel
+    bb_window, bb_std, long_ma_window = (
+        axis.ravel() for axis in np.meshgrid(*(np.asarray(values) for values in grid), indexing="ij")
+    )
+    size = len(bb_window)
+    folds = [results] if ranges is None else list(zip(*results))
+    tables = []
+    for fold, fold_results in enumerate(folds):
+        table = pd.DataFrame({
+            "symbol": pd.Categorical(np.repeat(symbols, size), categories=symbols),
+            "bb_window": np.tile(bb_window, len(symbols)).astype(np.int32),
+            "bb_std": np.tile(bb_std, len(symbols)).astype(np.float32),
+            "long_ma_window": np.tile(long_ma_window, len(symbols)).astype(np.int32),
+        })
+        for metric in SWEEP_METRICS:
+            dtype = np.int32 if metric == "trades" else np.float32
+            table[metric] = np.concatenate([result[metric].ravel() for result in fold_results]).astype(dtype)
+        if ranges is not None:
+            table.insert(0, "fold", np.int32(fold))
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True) if len(tables) > 1 else tables[0]
+
+
+def save_sweep(table, path):
+    """ Write a sweep table to a compressed .npz file, one array per column
+    """
+    columns = {column: table[column].to_numpy() for column in table.columns if column != "symbol"}
+    np.savez_compressed(
+        path,
+        symbols=np.array(table["symbol"].cat.categories, dtype=str),
+        symbol_codes=table["symbol"].cat.codes.to_numpy(),
+        **columns,
+    )
+
+
+def load_sweep(path):
+    """ Read a sweep table written by save_sweep
+    """
+    with np.load(path) as data:
+        table = pd.DataFrame({
+            "symbol": pd.Categorical.from_codes(data["symbol_codes"], categories=list(data["symbols"])),
+        })
+        for column in data.files:
+            if column not in ("symbols", "symbol_codes"):
+                table[column] = data[column]
+    return table
+
+
+def best_params(table, metric="sharpe", min_trades=10):
+    """ Best combination of every symbol according to `metric`
+
+        Args:
+            table(pd.DataFrame): sweep table as returned by run_sweep,
+            metric(str): column to maximize,
+            min_trades(int): combinations with fewer trades are ignored
+
+        Returns:
+            dict: symbol -> {"bb_window", "bb_std", "long_ma_window"}, in the format of params_coin
+    """
+    eligible = table[(table["trades"] >= min_trades) & table[metric].notna()]
+    best = eligible.loc[eligible.groupby("symbol", observed=True)[metric].idxmax()]
+    return {
+        row.symbol: {
+            "bb_window": int(row.bb_window),
+            "bb_std": float(row.bb_std),
+            "long_ma_window": int(row.long_ma_window),
+        }
+        for row in best.itertuples()
+    }
@@ -1,74 +1,452 @@
+from functools import lru_cache
 import pandas as pd
 import numpy as np
-import math
+from concurrent.futures import ThreadPoolExecutor
 from scipy.stats import norm
+from utilities.covariance import DenseCovariance, FactorCovariance, embed_covariance
+from utilities.panel import build_panel
+
+VAR_METHODS = ("parametric", "historical", "monte_carlo")
+
+
+@lru_cache(maxsize=None)
+def _normal_quantile(conf_level):
+    return norm.ppf(conf_level)
+
+
+def _simulate_pnl(loadings, specific_std, mean_return, exposure, size, seed, student_df=None):
+    # Un lot de scénarios corrélés r = mu + L.z (+ bruit spécifique), Student multivariée si student_df
+    rng = np.random.default_rng(seed)
+    scenarios = rng.standard_normal((size, loadings.shape[1])).dot(loadings.T)
+    if specific_std is not None:
+        scenarios += rng.standard_normal((size, len(specific_std))) * specific_std
+    if student_df is not None:
+        # Mise à l'échelle (df - 2) / df : queues épaisses à covariance inchangée
+        scenarios *= np.sqrt((student_df - 2) / rng.chisquare(student_df, size))[:, None]
+    return (scenarios + mean_return).dot(exposure)
+
 
 class ValueAtRisk:
-    def __init__(self, df_list):
-        self.df_list = df_list
-        self.cov = None
-        self.avg_return = None
+    """ Value at Risk of a long/short portfolio of perpetuals
+
+        Args:
+            df_list(dict): symbol -> OHLCV DataFrame indexed by timestamp, the close panel is built once,
+            panel(pd.DataFrame): time x symbol close panel, used instead of df_list,
+            fill(str): missing data policy of build_panel when the panel is built from df_list
+    """
+
+    def __init__(self, df_list=None, panel=None, fill=None):
+        if panel is None:
+            panel = build_panel(df_list, "close", fill)
+        self.panel = panel
+        self.symbols = list(panel.columns)
+        self._closes = panel.to_numpy(dtype=np.float64)
+        # Part minimale de rendements présents dans la fenêtre pour qu'une paire soit prise en compte
+        self.min_coverage = 0.9
+        # Covariance (DenseCovariance ou FactorCovariance) et rendement moyen des jambes longues,
+        # la jambe courte en est l'opposé
+        self.covariance = None
+        self.mean_return = None
+        # Modèle de covariance : "dense", "pca" (n_factors composantes) ou "market" (facteur marché)
+        self.cov_model = "dense"
+        self.n_factors = 5
+        self.market_symbol = None
+        # Paires sans historique suffisant : "penalize" (rendement de -1 sur l'exposition brute,
+        # traitement historique) ou "exclude" (ignorées dans le risque)
+        self.missing_policy = "penalize"
+        self.valid = np.zeros(len(self.symbols), dtype=bool)
+        self._cov = None
+        self._avg_return = None
         self.conf_level = 0.05
         self.usd_balance = 1
+        # Méthode de get_var : "parametric" (loi normale), "historical" ou "monte_carlo"
+        self.method = "parametric"
+        self.returns = None
+        self._scenario_factors = None
+        self.mc_scenarios = 100_000
+        self.mc_batch_size = 10_000
+        self.mc_seed = 0
+        # Threads de simulation (np.dot relâche le GIL), 1 pour tout calculer dans le thread appelant
+        self.mc_workers = 1
+        self.mc_student_df = None
 
     def update_cov(self, current_date, occurance_data=1000):
-        returns = pd.DataFrame()
-        returns["temp"] = [0] * (occurance_data)
-        for pair in self.df_list:
-            temp_df = self.df_list[pair].copy()
-            try:
-                # print(int(temp_df.loc[current_date]["iloc"]))
-                # print(current_date)
-                iloc_date = int(temp_df.loc[current_date]["iloc"])
-                if math.isnan(iloc_date) or iloc_date-occurance_data < 0:
-                    returns["long_"+pair] = -1
-                    returns["short_"+pair] = -1
-                else:
-                    returns["long_"+pair] = temp_df.iloc[iloc_date-occurance_data:iloc_date].reset_index()["close"].pct_change()
-                    returns["short_"+pair] = -temp_df.iloc[iloc_date-occurance_data:iloc_date].reset_index()["close"].pct_change()
-            except Exception as e:
-                returns["long_"+pair] = -1
-                returns["short_"+pair] = -1
+        # Fenêtre des occurance_data bougies précédant current_date, par recherche binaire sur l'index
+        end = self.panel.index.searchsorted(current_date, side="left")
+        closes = self._closes[max(end - occurance_data, 0):end]
+        returns = closes[1:] / closes[:-1] - 1
+        returns = returns[:-1]
+        # Paires sans historique suffisant ou sans bougie à current_date : rendement constant de -1
+        coverage = (~np.isnan(returns)).sum(axis=0)
+        valid = (coverage >= self.min_coverage * (occurance_data - 2)) & self._has_candle(current_date)
+        returns[:, ~valid] = -1
+
         # Generate Var-Cov matrix
-        del returns["temp"]
-        returns = returns.iloc[:-1]
-        self.cov = returns.cov()
-        self.cov = self.cov.replace(0.0, 1.0)
-        # Calculate mean returns for each stock
-        self.avg_return = returns.mean()
-        return returns
-
-    def get_var(self, positions):
+        valid_returns = returns[:, valid]
+        if np.isnan(valid_returns).any():
+            mean_return = np.nanmean(returns, axis=0)
+            if self.cov_model == "dense":
+                model = DenseCovariance(pd.DataFrame(valid_returns).cov().to_numpy())
+            else:
+                model = self._fit_factor_model(valid, returns=valid_returns[~np.isnan(valid_returns).any(axis=1)])
+        else:
+            mean_return = returns.mean(axis=0)
+            if self.cov_model == "dense":
+                n_valid = valid_returns.shape[1]
+                model = DenseCovariance(np.cov(valid_returns, rowvar=False, ddof=1).reshape(n_valid, n_valid))
+            else:
+                model = self._fit_factor_model(valid, returns=valid_returns)
+        self._set_moments(model, mean_return, valid)
+        self.returns = returns
+        return pd.DataFrame(returns, columns=self.symbols)
+
+    def _has_candle(self, current_date):
+        # Paires ayant une bougie à current_date, aucune si la date est absente du panel
+        end = self.panel.index.searchsorted(current_date, side="left")
+        if end < len(self.panel) and self.panel.index[end] == current_date:
+            return ~np.isnan(self._closes[end])
+        return np.zeros(len(self.symbols), dtype=bool)
+
+    def update_cov_from(self, engine, min_count=None, keep_returns=True, current_date=None):
+        """ Take the covariance and mean returns of an incremental CovarianceEngine
+
+            Args:
+                engine(CovarianceEngine): engine built on the same symbols,
+                min_count(int): returns needed for a symbol to be used, the others get the
+                    same treatment as pairs without enough history in update_cov. By default
+                    min_coverage of the engine window (as update_cov), 2 for an engine without window,
+                keep_returns(bool): copy the engine's return window for historical VaR,
+                current_date(pd.Timestamp): pairs without a candle at this date are invalid, as in
+                    update_cov, None to skip the check
+        """
+        if engine.symbols != self.symbols:
+            raise ValueError("Covariance engine symbols do not match")
+        if min_count is None:
+            window = getattr(engine, "window", None)
+            min_count = 2 if window is None else self.min_coverage * window
+        valid = engine.counts() >= min_count
+        if current_date is not None:
+            valid &= self._has_candle(current_date)
+        cov = engine.covariance()
+        if not valid.all():
+            cov = cov[np.ix_(valid, valid)]
+        returns = engine.returns() if keep_returns or self.cov_model != "dense" else None
+        if self.cov_model == "dense":
+            model = DenseCovariance(cov)
+        elif returns is not None:
+            returns = returns[:, valid]
+            model = self._fit_factor_model(valid, returns=returns[~np.isnan(returns).any(axis=1)])
+        else:
+            model = self._fit_factor_model(valid, cov=cov)
+        self._set_moments(model, engine.mean(), valid)
+        self.returns = returns
+
+    def _fit_factor_model(self, valid, returns=None, cov=None):
+        if self.cov_model == "pca":
+            return FactorCovariance.pca(returns, cov, self.n_factors)
+        if self.cov_model == "market":
+            weights = None
+            if self.market_symbol is not None:
+                valid_symbols = [pair for pair, ok in zip(self.symbols, valid) if ok]
+                if self.market_symbol not in valid_symbols:
+                    raise ValueError(f"Market symbol {self.market_symbol} is not among the valid symbols")
+                weights = np.array([pair == self.market_symbol for pair in valid_symbols], dtype=np.float64)
+            return FactorCovariance.market(returns, cov, weights)
+        raise ValueError(f"Invalid covariance model: {self.cov_model}")
+
+    def _set_moments(self, model, mean_return, valid):
+        mean_return = np.array(mean_return, dtype=np.float64)
+        mean_return[~valid] = -1 if self.missing_policy == "penalize" else 0.0
+        self.covariance = embed_covariance(model, valid)
+        self.mean_return = mean_return
+        self.valid = valid
+        self._cov = None
+        self._avg_return = None
+        self._scenario_factors = None
+
+    @property
+    def cov_matrix(self):
+        # Matrice N x N dense (construite à la demande pour un modèle à facteurs)
+        return None if self.covariance is None else self.covariance.dense()
+
+    @property
+    def cov(self):
+        # Vue signée 2N x 2N (long_pair, short_pair, ...) construite seulement à la demande
+        if self._cov is None and self.cov_matrix is not None:
+            cov = np.kron(self.cov_matrix, np.array([[1.0, -1.0], [-1.0, 1.0]]))
+            if self.missing_policy == "penalize":
+                invalid_legs = np.repeat(~self.valid, 2)
+                cov[invalid_legs, :] = 1.0
+                cov[:, invalid_legs] = 1.0
+            self._cov = pd.DataFrame(cov, index=self._leg_labels(), columns=self._leg_labels())
+        return self._cov
+
+    @property
+    def avg_return(self):
+        if self._avg_return is None and self.mean_return is not None:
+            short_return = np.where(self.valid, -self.mean_return, self.mean_return)
+            self._avg_return = pd.Series(
+                np.column_stack([self.mean_return, short_return]).ravel(),
+                index=self._leg_labels(),
+            )
+        return self._avg_return
+
+    def _leg_labels(self):
+        return [leg + pair for pair in self.symbols for leg in ("long_", "short_")]
+
+    def exposure_vectors(self, positions):
+        # Expositions longues et courtes par paire, dans l'ordre de self.symbols
+        long = np.array([positions[pair]["long"] if pair in positions else 0.0 for pair in self.symbols])
+        short = np.array([positions[pair]["short"] if pair in positions else 0.0 for pair in self.symbols])
+        return long, short
+
+    def _gross_invalid(self, gross):
+        # Exposition brute sur les paires sans historique, qui perdent tout avec missing_policy="penalize"
+        if self.missing_policy == "penalize":
+            return gross[..., ~self.valid].sum(axis=-1)
+        if self.missing_policy == "exclude":
+            return np.zeros(gross.shape[:-1])
+        raise ValueError(f"Invalid missing policy: {self.missing_policy}")
+
+    def _portfolio_moments(self, long, short):
+        # Rendement moyen et variance du PnL du portefeuille à partir de la covariance N x N :
+        # la jambe courte étant l'opposé de la jambe longue, l'exposition nette suffit.
+        # Les paires sans historique, pénalisées comme entièrement corrélées à tout le portefeuille,
+        # ne dépendent que de l'exposition brute.
+        net = np.where(self.valid, long - short, 0.0)
+        gross_invalid = self._gross_invalid(long + short)
+        gross_valid = (long + short)[self.valid].sum()
+        mean = self.mean_return.dot(net) - gross_invalid
+        variance = net.dot(self.covariance.dot(net)) + 2 * gross_invalid * gross_valid + gross_invalid ** 2
+        return mean, variance
+
+    def _delta_moments(self, long, short, sigma_net, delta_long, delta_short):
+        # Moments après chaque delta (K x N) : (w+d)'S(w+d) = w'Sw + 2d'Sw + d'Sd
+        # sigma_net = S.w est fourni par l'appelant, seules les colonnes touchées par les deltas sont lues
+        net = np.where(self.valid, long - short, 0.0)
+        delta_net = np.where(self.valid, delta_long - delta_short, 0.0)
+        columns = np.flatnonzero(delta_net.any(axis=0))
+        delta_sigma = delta_net[:, columns].dot(self.covariance.rows(columns))
+
+        delta_gross = delta_long + delta_short
+        gross_invalid = self._gross_invalid(long + short) + self._gross_invalid(delta_gross)
+        gross_valid = (long + short)[self.valid].sum() + delta_gross[:, self.valid].sum(axis=1)
+        gross = (long + short).sum() + delta_gross.sum(axis=1)
+
+        mean = self.mean_return.dot(net) + delta_net.dot(self.mean_return) - gross_invalid
+        variance = (
+            net.dot(sigma_net)
+            + 2 * delta_net.dot(sigma_net)
+            + np.einsum("kn,kn->k", delta_net, delta_sigma)
+            + 2 * gross_invalid * gross_valid + gross_invalid ** 2
+        )
+        return mean, variance, gross, delta_sigma
+
+    def _var_from_moments(self, mean, variance, gross):
+        # Calculate mean and standard deviation of investment
+        mean_investment = gross + mean
+        stdev_investment = np.sqrt(variance)
+
+        # Inverse cumulative distribution function of a normal distribution
+        # with the mean and standard deviation of our portfolio calculated above,
+        # norm.ppf(q, loc, scale) = loc + scale * norm.ppf(q) (NaN when scale is not > 0)
+        with np.errstate(invalid='ignore'):
+            cutoff1 = np.where(
+                stdev_investment > 0,
+                mean_investment + stdev_investment * _normal_quantile(self.conf_level),
+                np.nan,
+            )
+
+        #Finally, we can calculate the VaR at our confidence interval
+        var_1d1 = np.where(gross == 0, 0.0, gross - cutoff1)
+
+        return var_1d1 / self.usd_balance * 100
+
+    def get_var(self, positions, method=None):
+        """ VaR of the positions in % of usd_balance
+
+            Args:
+                positions(dict): pair -> {"long", "short"} exposure,
+                method(str): one of VAR_METHODS, self.method by default
+        """
         usd_in_position = 0
         for pair in list(positions.keys()):
             usd_in_position += positions[pair]["long"] + positions[pair]["short"]
-        weights = []   
         if usd_in_position == 0:
             return 0
-        for pair in list(positions.keys()):
-            weights.append(positions[pair]["long"] / usd_in_position)
-            weights.append(positions[pair]["short"] / usd_in_position)
 
-        weights = np.array(weights)
+        long, short = self.exposure_vectors(positions)
+        method = method or self.method
+        if method == "parametric":
+            port_mean, port_variance = self._portfolio_moments(long, short)
+            return float(self._var_from_moments(port_mean, port_variance, usd_in_position))
+        pnl = self.scenario_pnl(long, short, method)
+        return -np.quantile(pnl, self.conf_level) / self.usd_balance * 100
 
-        port_mean = self.avg_return.dot(weights)
+    def get_expected_shortfall(self, positions, method=None):
+        """ Expected Shortfall (mean loss beyond the VaR) of the positions in % of usd_balance
+        """
+        long, short = self.exposure_vectors(positions)
+        if (long + short).sum() == 0:
+            return 0
+        method = method or self.method
+        if method == "parametric":
+            port_mean, port_variance = self._portfolio_moments(long, short)
+            tail = norm.pdf(norm.ppf(self.conf_level)) / self.conf_level
+            return float(-port_mean + np.sqrt(port_variance) * tail) / self.usd_balance * 100
+        pnl = self.scenario_pnl(long, short, method)
+        cutoff = np.quantile(pnl, self.conf_level)
+        return -pnl[pnl <= cutoff].mean() / self.usd_balance * 100
 
-        # Calculate portfolio standard deviation
-        port_stdev = np.sqrt(weights.T.dot(self.cov).dot(weights))
+    def scenario_pnl(self, long, short, method="historical"):
+        """ PnL of the portfolio in every scenario
 
-        # Calculate mean of investment
-        mean_investment = (1+port_mean) * usd_in_position
+            "historical" replays each row of the aligned return panel, "monte_carlo" draws
+            self.mc_scenarios correlated returns from the covariance.
 
-        # Calculate standard deviation of investmnet
-        stdev_investment = usd_in_position * port_stdev
+            Returns:
+                np.ndarray: PnL per scenario, in exposure units
+        """
+        net = np.where(self.valid, long - short, 0.0)[self.valid]
+        # Les paires sans historique perdent toute leur exposition brute dans chaque scénario
+        gross_invalid = self._gross_invalid(long + short)
+        if method == "historical":
+            if self.returns is None:
+                raise ValueError("Historical VaR needs the return panel (update_cov or a RollingCovariance)")
+            returns = self.returns[:, self.valid]
+            returns = returns[~np.isnan(returns).any(axis=1)]
+            return returns.dot(net) - gross_invalid
+        if method == "monte_carlo":
+            return self._monte_carlo_pnl(net) - gross_invalid
+        raise ValueError(f"Invalid VaR method: {method}")
 
-        # Using SciPy ppf method to generate values for the
-        # inverse cumulative distribution function to a normal distribution
-        # Plugging in the mean, standard deviation of our portfolio
-        # as calculated above
-        cutoff1 = norm.ppf(self.conf_level, mean_investment, stdev_investment)
+    def _monte_carlo_pnl(self, net):
+        # Lots indépendants avec une graine dérivée de mc_seed : résultat identique quel que soit le nombre de workers
+        if self.mc_student_df is not None and self.mc_student_df <= 2:
+            raise ValueError(f"mc_student_df must be greater than 2 for a finite covariance: {self.mc_student_df}")
+        if self._scenario_factors is None:
+            self._scenario_factors = self.covariance.subset(self.valid).scenario_factors()
+        loadings, specific_std = self._scenario_factors
+        mean_return = self.mean_return[self.valid]
+        sizes = [self.mc_batch_size] * (self.mc_scenarios // self.mc_batch_size)
+        if self.mc_scenarios % self.mc_batch_size:
+            sizes.append(self.mc_scenarios % self.mc_batch_size)
+        seeds = np.random.SeedSequence(self.mc_seed).spawn(len(sizes))
+        args = [(loadings, specific_std, mean_return, net, size, seed, self.mc_student_df) for size, seed in zip(sizes, seeds)]
+        workers = min(self.mc_workers or 1, len(args))
+        if workers <= 1:
+            return np.concatenate([_simulate_pnl(*arg) for arg in args])
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return np.concatenate(list(executor.map(_simulate_pnl, *zip(*args))))
 
-        #Finally, we can calculate the VaR at our confidence interval
-        var_1d1 = usd_in_position - cutoff1
-        
-        return var_1d1 / self.usd_balance * 100
+    def get_var_batch(self, long, short, delta_long, delta_short):
+        """ Post-trade parametric VaR of several candidate trades at once
+
+            Args:
+                long(np.array): current long exposure per symbol (order of self.symbols),
+                short(np.array): current short exposure per symbol,
+                delta_long(np.array): K x N long exposure added by each candidate,
+                delta_short(np.array): K x N short exposure added by each candidate
+
+            Returns:
+                np.array: VaR of the portfolio after each candidate (K)
+        """
+        long = np.asarray(long, dtype=np.float64)
+        short = np.asarray(short, dtype=np.float64)
+        delta_long = np.atleast_2d(np.asarray(delta_long, dtype=np.float64))
+        delta_short = np.atleast_2d(np.asarray(delta_short, dtype=np.float64))
+        sigma_net = self.covariance.dot(np.where(self.valid, long - short, 0.0))
+        mean, variance, gross, _ = self._delta_moments(long, short, sigma_net, delta_long, delta_short)
+        return self._var_from_moments(mean, variance, gross)
+
+    def accept_sequential(self, positions, candidates, max_var, max_side_exposition=None):
+        """ Greedy first-come gating of candidate trades
+
+            Each candidate is checked against the portfolio holding every previously accepted one.
+
+            Args:
+                positions(dict): pair -> {"long", "short"} current exposure,
+                candidates(list): (pair, side, exposure) in priority order,
+                max_var(float): maximum VaR after the trade,
+                max_side_exposition(float): maximum total exposure of the traded side, None to disable
+
+            Returns:
+                list: (accepted, next_var) for every candidate
+        """
+        gate = VarGate(self, positions, max_var, max_side_exposition)
+        results = []
+        for pair, side, exposure in candidates:
+            accepted, next_var = gate.check(pair, side, exposure)
+            if accepted:
+                gate.accept(pair, side, exposure)
+            results.append((accepted, next_var))
+        return results
+
+
+class VarGate():
+    """ Incremental parametric VaR check of trades opened one after the other
+
+        Keeps the portfolio moments and S.w up to date: each check is O(1) through
+        (w+d)'S(w+d) = w'Sw + 2d(Sw)_j + d²S_jj, each accepted trade costs O(N)
+        (O(N.k) with a factor model).
+
+        Args:
+            var(ValueAtRisk): risk model with an up to date covariance,
+            positions(dict): pair -> {"long", "short"} current exposure, or a (long, short)
+                tuple of exposure arrays in the order of var.symbols,
+            max_var(float): maximum VaR after the trade,
+            max_side_exposition(float): maximum total exposure of the traded side, None to disable
+    """
+
+    def __init__(self, var, positions, max_var, max_side_exposition=None):
+        self.var = var
+        self.max_var = max_var
+        self.max_side_exposition = max_side_exposition
+        self.index = {pair: i for i, pair in enumerate(var.symbols)}
+        if isinstance(positions, dict):
+            long, short = var.exposure_vectors(positions)
+        else:
+            long, short = (np.asarray(exposure, dtype=np.float64) for exposure in positions)
+        net = np.where(var.valid, long - short, 0.0)
+        self.sigma_net = var.covariance.dot(net)
+        self.diagonal = var.covariance.diagonal()
+        self.quadratic = net.dot(self.sigma_net)
+        self.gross_invalid = float(var._gross_invalid(long + short))
+        self.gross_valid = (long + short)[var.valid].sum()
+        self.gross = (long + short).sum()
+        self.mean = var.mean_return.dot(net) - self.gross_invalid
+        self.exposition = {"long": long.sum(), "short": short.sum()}
+
+    def _after(self, pair, side, exposure):
+        # Moments du portefeuille après une seule transaction
+        i = self.index[pair]
+        if self.var.valid[i]:
+            delta = exposure if side == "long" else -exposure
+            quadratic = self.quadratic + 2 * delta * self.sigma_net[i] + delta ** 2 * self.diagonal[i]
+            mean = self.mean + delta * self.var.mean_return[i]
+            gross_valid, gross_invalid = self.gross_valid + exposure, self.gross_invalid
+        else:
+            penalty = exposure if self.var.missing_policy == "penalize" else 0.0
+            delta, quadratic = 0.0, self.quadratic
+            mean = self.mean - penalty
+            gross_valid, gross_invalid = self.gross_valid, self.gross_invalid + penalty
+        return i, delta, quadratic, mean, gross_valid, gross_invalid
+
+    def check(self, pair, side, exposure):
+        """ Returns:
+                tuple: (allowed, VaR after the trade)
+        """
+        _, _, quadratic, mean, gross_valid, gross_invalid = self._after(pair, side, exposure)
+        variance = quadratic + 2 * gross_invalid * gross_valid + gross_invalid ** 2
+        next_var = float(self.var._var_from_moments(mean, variance, self.gross + exposure))
+        blocked = next_var > self.max_var
+        if self.max_side_exposition is not None:
+            blocked = blocked or self.exposition[side] + exposure > self.max_side_exposition
+        return not blocked, next_var
+
+    def accept(self, pair, side, exposure):
+        i, delta, self.quadratic, self.mean, self.gross_valid, self.gross_invalid = self._after(pair, side, exposure)
+        if delta:
+            self.sigma_net = self.sigma_net + delta * self.var.covariance.rows([i])[0]
+        self.gross += exposure
+        self.exposition[side] += exposure
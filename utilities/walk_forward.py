@@ -0,0 +1,223 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from utilities.backtest import run_backtest
+from utilities.bol_trend import bol_trend_signals
+from utilities.panel import rolling_mean, rolling_mean_std, lag
+from utilities.sweep import run_sweep, best_params
+
+PARAM_COLUMNS = ["bb_window", "bb_std", "long_ma_window"]
+
+
+def walk_forward_folds(n_bars, train_bars, test_bars, step=None):
+    """ Rolling in-sample / out-of-sample windows over n_bars candles
+
+        Args:
+            train_bars(int): length of every in-sample window,
+            test_bars(int): length of every out-of-sample window, following its in-sample window,
+            step(int): shift between two folds, test_bars by default (contiguous out-of-sample windows)
+
+        Returns:
+            list: (train_start, train_end, test_start, test_end) bar positions, ends excluded
+    """
+    step = step or test_bars
+    folds = []
+    start = 0
+    while start + train_bars < n_bars:
+        test_end = min(start + train_bars + test_bars, n_bars)
+        folds.append((start, start + train_bars, start + train_bars, test_end))
+        start += step
+    return folds
+
+
+@dataclass
+class WalkForwardResult():
+    """ Output of run_walk_forward
+
+        folds: one row per fold, bounds and out-of-sample statistics,
+        params: parameters chosen in-sample, one row per fold and symbol,
+        equity: out-of-sample equity of the folds chained together
+    """
+    folds: pd.DataFrame
+    params: pd.DataFrame
+    equity: pd.Series
+
+    def stability(self):
+        """ Stability of the parameters chosen for every symbol across the folds
+
+            Returns:
+                pd.DataFrame: per symbol, folds where it was traded, distinct parameter sets, changes
+                    between consecutive folds and standard deviation of each parameter
+        """
+        rows = {}
+        for symbol, chosen in self.params.groupby("symbol", sort=False):
+            chosen = chosen.sort_values("fold")
+            combos = list(chosen[PARAM_COLUMNS].itertuples(index=False, name=None))
+            rows[symbol] = {
+                "folds": len(combos),
+                "distinct": len(set(combos)),
+                "changes": sum(previous != current for previous, current in zip(combos, combos[1:])),
+                **{f"{column}_std": float(chosen[column].std(ddof=0)) for column in PARAM_COLUMNS},
+            }
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def _fold_indicators(values, index, columns, selection, cache, start, end):
+    # Indicateurs des paires retenues sur [start, end), découpés dans les statistiques de tout l'historique
+    shape = (end - start + 1, len(columns))
+    ma_band, std, long_ma = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+    bb_std = np.zeros(len(columns))
+    rows = slice(start - 1, end) if start > 0 else slice(0, end)
+    offset = 0 if start > 0 else 1
+    for column, params in selection.items():
+        mean, deviation = cache["bb", params["bb_window"], column]
+        ma_band[offset:, column], std[offset:, column] = mean[rows], deviation[rows]
+        long_ma[offset:, column] = cache["ma", params["long_ma_window"], column][rows]
+        bb_std[column] = params["bb_std"]
+    closes = np.full(shape, np.nan)
+    closes[offset:] = values[rows]
+    higher_band = ma_band + bb_std * std
+    lower_band = ma_band - bb_std * std
+    indicators = {
+        "lower_band": lower_band,
+        "higher_band": higher_band,
+        "ma_band": ma_band,
+        "long_ma": long_ma,
+        "n1_close": lag(closes),
+        "n1_lower_band": lag(lower_band),
+        "n1_higher_band": lag(higher_band),
+    }
+    return {
+        name: pd.DataFrame(array[1:], index=index[start:end], columns=columns)
+        for name, array in indicators.items()
+    }
+
+
+def run_walk_forward(close, wallet_exposure, bb_windows, bb_stds, long_ma_windows, train_bars, test_bars,
+                     step=None, metric="sharpe", min_trades=10, workers=None, var_window=987, **kwargs):
+    """ Walk-forward validation of the Bollinger trend parameters
+
+        Every fold picks the best combination of each symbol on its in-sample window (best_params on a
+        run_sweep over the fold ranges), then replays the selection out-of-sample with run_backtest,
+        VaR gating included. Indicators are computed once over the whole history and sliced per fold,
+        for the in-sample sweep as for the out-of-sample signals. Out-of-sample folds run in parallel,
+        each from flat positions, and are chained on their returns.
+
+        Args:
+            close(pd.DataFrame): time x symbol close panel,
+            wallet_exposure(dict): symbol -> fraction of equity per position before leverage,
+            bb_windows, bb_stds, long_ma_windows(list): values of the grid,
+            train_bars, test_bars, step(int): fold layout, see walk_forward_folds,
+            metric(str): in-sample metric maximized (SWEEP_METRICS),
+            min_trades(int): in-sample combinations with fewer trades are ignored,
+            workers(int): number of processes,
+            var_window(int): number of returns of the covariance window, also the warm-up kept before
+                every out-of-sample window,
+            kwargs: leverage, types, max_var, max_side_exposition, fee_rate, funding_rate (a float,
+                the in-sample sweep not taking per-bar rates), funding_interval, initial_balance
+                passed to run_backtest
+
+        Returns:
+            WalkForwardResult
+    """
+    symbols = list(close.columns)
+    index = close.index
+    values = close.to_numpy(dtype=np.float64)
+    folds = walk_forward_folds(len(index), train_bars, test_bars, step)
+    if len(folds) == 0:
+        raise ValueError(f"Historique trop court pour un walk-forward : {len(index)} bougies pour {train_bars} in-sample")
+    initial_balance = kwargs.pop("initial_balance", 1000)
+    if isinstance(kwargs.get("funding_rate"), pd.DataFrame):
+        raise ValueError("Le walk-forward n'accepte qu'un funding_rate constant, le sweep in-sample ne lit pas de taux par bougie")
+
+    # Optimisation in-sample de tous les folds sur les mêmes indicateurs, positions dimensionnées
+    # comme dans le replay out-of-sample (wallet_exposure * leverage)
+    sweep_options = {
+        key: kwargs[key] for key in ("leverage", "types", "fee_rate", "funding_rate", "funding_interval")
+        if key in kwargs
+    }
+    sweep_options["exposure"] = {symbol: wallet_exposure[symbol] for symbol in symbols}
+    table = run_sweep(
+        close, bb_windows, bb_stds, long_ma_windows,
+        ranges=[(train_start, train_end) for train_start, train_end, _, _ in folds],
+        workers=workers, **sweep_options,
+    )
+    selections = []
+    params_rows = []
+    for fold, fold_table in table.groupby("fold"):
+        chosen = best_params(fold_table, metric, min_trades)
+        selections.append({symbols.index(symbol): params for symbol, params in chosen.items()})
+        scores = fold_table.set_index(["symbol", *PARAM_COLUMNS])[metric]
+        for symbol, params in chosen.items():
+            params_rows.append({
+                "fold": fold, "symbol": symbol, **params,
+                metric: float(scores.loc[(symbol, params["bb_window"], np.float32(params["bb_std"]),
+                                          params["long_ma_window"])]),
+            })
+
+    # Statistiques glissantes calculées une fois sur tout l'historique pour chaque paramètre retenu
+    cache = {}
+    needed_bb = {}
+    needed_ma = {}
+    for selection in selections:
+        for column, params in selection.items():
+            needed_bb.setdefault(params["bb_window"], set()).add(column)
+            needed_ma.setdefault(params["long_ma_window"], set()).add(column)
+    for window, columns in needed_bb.items():
+        columns = sorted(columns)
+        mean, deviation = rolling_mean_std(values, window, columns)
+        for position, column in enumerate(columns):
+            cache["bb", window, column] = mean[:, position], deviation[:, position]
+    for window, columns in needed_ma.items():
+        columns = sorted(columns)
+        mean = rolling_mean(values, window, columns)
+        for position, column in enumerate(columns):
+            cache["ma", window, column] = mean[:, position]
+
+    # Out-of-sample : fenêtre de covariance reprise avant chaque fold, sans signal d'entrée avant son début
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for (_, _, test_start, test_end), selection in zip(folds, selections):
+            start = max(test_start - var_window - 2, 0)
+            fold_close = close.iloc[start:test_end]
+            signals = bol_trend_signals(
+                fold_close, _fold_indicators(values, index, close.columns, selection, cache, start, test_end),
+            )
+            for name in ("open_long", "open_short"):
+                signals[name].iloc[:test_start - start] = False
+            futures.append(executor.submit(
+                run_backtest, fold_close, signals, wallet_exposure, var_window=var_window,
+                initial_balance=1, **kwargs,
+            ))
+        results = [future.result() for future in futures]
+
+    equity = []
+    fold_rows = []
+    balance = float(initial_balance)
+    for fold, ((train_start, train_end, test_start, test_end), result) in enumerate(zip(folds, results)):
+        fold_equity = result.equity.loc[index[test_start]:] * balance
+        trades = result.trades
+        drawdown = fold_equity / fold_equity.cummax() - 1
+        fold_rows.append({
+            "fold": fold,
+            "train_start": index[train_start],
+            "train_end": index[train_end - 1],
+            "test_start": index[test_start],
+            "test_end": index[test_end - 1],
+            "symbols": len(selections[fold]),
+            "return": float(fold_equity.iloc[-1] / balance - 1),
+            "max_drawdown": float(drawdown.min()),
+            "trades": len(trades),
+            "win_rate": float((trades["pnl"] > 0).mean()) if len(trades) else math.nan,
+        })
+        equity.append(fold_equity)
+        balance = float(fold_equity.iloc[-1])
+
+    params = pd.DataFrame(params_rows, columns=["fold", "symbol", *PARAM_COLUMNS, metric])
+    return WalkForwardResult(
+        folds=pd.DataFrame(fold_rows),
+        params=params,
+        equity=pd.concat(equity).rename("equity"),
+    )